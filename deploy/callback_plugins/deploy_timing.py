@@ -0,0 +1,130 @@
+"""Ansible callback plugin recording how long each task took on each host"""
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type # pylint: disable=invalid-name
+
+import json
+import os
+import time
+
+from ansible.plugins.callback import CallbackBase
+
+DOCUMENTATION = """
+    name: deploy_timing
+    type: aggregate
+    short_description: record per-task and per-host durations in a JSON file
+    description:
+      - Saves the duration of each task, overall and on each host, to a JSON file
+        for scripts/deploy-report.py. Does nothing unless the output file is set,
+        which scripts/deploy.py does.
+    options:
+      output_file:
+        description: JSON file to save the timings to
+        env:
+          - name: RHUI_DEPLOY_TIMING_FILE
+"""
+
+class CallbackModule(CallbackBase):
+    """record per-task and per-host durations"""
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = "aggregate"
+    CALLBACK_NAME = "deploy_timing"
+    # loaded from callback_plugins in ansible.cfg, inert without the output file
+    CALLBACK_NEEDS_WHITELIST = False
+    CALLBACK_NEEDS_ENABLED = False
+
+    def __init__(self):
+        super().__init__()
+        self._output_file = None
+        self._playbook = ""
+        self._play = ""
+        self._started = time.time()
+        self._tasks = []
+        self._current = None
+        self._by_uuid = {}
+        self._host_starts = {}
+
+    def set_options(self, task_keys=None, var_options=None, direct=None):
+        super().set_options(task_keys=task_keys, var_options=var_options, direct=direct)
+        self._output_file = self.get_option("output_file")
+
+    def _finish_task(self, now):
+        """set the duration of the task that was running until now"""
+        if self._current is not None:
+            self._current["duration"] = round(now - self._current["started"], 3)
+            self._current = None
+
+    def _start_task(self, task):
+        """start measuring the task"""
+        now = time.time()
+        self._finish_task(now)
+        role = task._role.get_name() if task._role else "" # pylint: disable=protected-access
+        name = task.get_name().strip()
+        # role tasks are named "role : task" by Ansible
+        if role and name.startswith(f"{role} : "):
+            name = name[len(role) + 3:]
+        self._current = {"name": name,
+                         "role": role,
+                         "play": self._play,
+                         "action": task.action,
+                         "started": now,
+                         "duration": 0,
+                         "hosts": {}}
+        self._tasks.append(self._current)
+        self._by_uuid[task._uuid] = self._current # pylint: disable=protected-access
+
+    def _host_finished(self, result, status):
+        """record the duration of the task on the host"""
+        host = result._host.get_name() # pylint: disable=protected-access
+        uuid = result._task._uuid # pylint: disable=protected-access
+        now = time.time()
+        started = self._host_starts.pop((host, uuid), None)
+        if uuid not in self._by_uuid or started is None:
+            return
+        self._by_uuid[uuid]["hosts"][host] = {"duration": round(now - started, 3),
+                                              "status": status}
+
+    def v2_playbook_on_start(self, playbook):
+        self._playbook = os.path.basename(playbook._file_name) # pylint: disable=protected-access
+        self._started = time.time()
+
+    def v2_playbook_on_play_start(self, play):
+        self._play = play.get_name().strip()
+
+    def v2_playbook_on_task_start(self, task, is_conditional):
+        self._start_task(task)
+
+    def v2_playbook_on_handler_task_start(self, task):
+        self._start_task(task)
+
+    def v2_runner_on_start(self, host, task):
+        uuid = task._uuid # pylint: disable=protected-access
+        self._host_starts[(host.get_name(), uuid)] = time.time()
+
+    def v2_runner_on_ok(self, result):
+        self._host_finished(result, "ok")
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._host_finished(result, "ignored" if ignore_errors else "failed")
+
+    def v2_runner_on_skipped(self, result):
+        self._host_finished(result, "skipped")
+
+    def v2_runner_on_unreachable(self, result):
+        self._host_finished(result, "unreachable")
+
+    def v2_playbook_on_stats(self, stats):
+        now = time.time()
+        self._finish_task(now)
+        if not self._output_file:
+            return
+        output_file = os.path.expanduser(self._output_file)
+        os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+        timings = {"playbook": self._playbook,
+                   "started": self._started,
+                   "duration": round(now - self._started, 3),
+                   "tasks": self._tasks}
+        # write the whole file or nothing
+        with open(f"{output_file}.tmp", "w", encoding="utf-8") as timing_file:
+            json.dump(timings, timing_file, indent=1)
+        os.replace(f"{output_file}.tmp", output_file)
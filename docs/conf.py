@@ -40,7 +40,7 @@ extensions = ['sphinx.ext.autodoc',
     'sphinx.ext.ifconfig',
     'sphinx.ext.viewcode']
 
-autodoc_mock_imports = ["nose", "stitches", "yaml", "rhui4_tests_lib.rhuimanager", "xmltodict"]
+autodoc_mock_imports = ["nose", "stitches", "yaml", "rhui4_tests_lib.rhuimanager"]
 
 # Add any paths that contain templates here, relative to this directory.
 templates_path = ['_templates']
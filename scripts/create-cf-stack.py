@@ -3,7 +3,6 @@
 """ Create CloudFormation stack """
 
 import os
-import socket
 import argparse
 import time
 import logging
@@ -12,12 +11,16 @@ import random
 import string
 import json
 import re
+from collections import namedtuple
 
 import boto3
 import yaml
 
 instance_types = {"arm64": "t4g.large", "x86_64": "m5.large"}
 
+# a node in the inventory: its public hostname and its private IP address
+Node = namedtuple("Node", ["hostname", "private_ip"])
+
 argparser = argparse.ArgumentParser(description='Create CloudFormation stack for RHUI 4')
 argparser.add_argument('--rhua', help=argparse.SUPPRESS)
 argparser.add_argument('--iso', help=argparse.SUPPRESS)
@@ -44,6 +47,8 @@ argparser.add_argument('--rhui5launchpad', help='add a launchpad for a future mi
 argparser.add_argument('--rhui5rhua', help='add a RHUA for a future (non-in-place) migration to RHUI 5', action='store_const', const=True, default=False)
 argparser.add_argument('--input-conf', default="/etc/rhui_ec2.yaml", help='use supplied yaml config file')
 argparser.add_argument('--output-conf', help='output file')
+argparser.add_argument('--output-yaml', help='also write the inventory in the YAML format to this file')
+argparser.add_argument('--output-hosts', help='also write the addresses of the nodes in the /etc/hosts format to this file')
 argparser.add_argument('--region', default="eu-west-1", help='use specified region')
 argparser.add_argument('--debug', action='store_const', const=True,
                        default=False, help='debug mode')
@@ -475,49 +480,171 @@ if args.dry_run:
     print(parameters)
     sys.exit(0)
 
+# the stack is polled less and less often while nothing is happening, and more often again
+# as soon as there is progress
+POLL_MIN = 5
+POLL_MAX = 30
+STACK_FAILED_STATUSES = ("CREATE_FAILED", "ROLLBACK_IN_PROGRESS", "ROLLBACK_FAILED", "ROLLBACK_COMPLETE",
+                         "DELETE_IN_PROGRESS", "DELETE_FAILED", "DELETE_COMPLETE")
+
+
+def new_stack_events(cf_client, stack_id, seen):
+    """return the stack events not seen yet, oldest first, and add their IDs to the seen set"""
+    events = []
+    for page in cf_client.get_paginator("describe_stack_events").paginate(StackName=stack_id):
+        # the events are returned newest first, so the rest of them have been seen before
+        new = [event for event in page["StackEvents"] if event["EventId"] not in seen]
+        events.extend(new)
+        if len(new) < len(page["StackEvents"]):
+            break
+    seen.update(event["EventId"] for event in events)
+    return events[::-1]
+
+
+def wait_for_stack(cf_client, stack_id, timeout):
+    """log the events of the stack until it is created or fails; return True if it has been created"""
+    seen = set()
+    delay = POLL_MIN
+    # CloudFormation itself gives up after the timeout, but the rollback can take a while, too
+    deadline = time.time() + timeout * 60 + 600
+    while time.time() < deadline:
+        time.sleep(delay)
+        events = new_stack_events(cf_client, stack_id, seen)
+        for event in events:
+            logging.info("%s %s: %s %s", event["ResourceType"], event["LogicalResourceId"],
+                         event["ResourceStatus"], event.get("ResourceStatusReason", ""))
+            if event["ResourceType"] == "AWS::CloudFormation::Stack" and event["LogicalResourceId"] == stack_id:
+                if event["ResourceStatus"] == "CREATE_COMPLETE":
+                    logging.info("Stack creation completed")
+                    return True
+                if event["ResourceStatus"] in STACK_FAILED_STATUSES:
+                    logging.info("Stack creation failed: %s", event["ResourceStatus"])
+                    return False
+        delay = POLL_MIN if events else min(delay * 2, POLL_MAX)
+    logging.error("The stack is still not complete; giving up waiting for it")
+    return False
+
+
+def get_nodes(ec2_client, instances):
+    """return {role: Node} for the {role: instance ID} dict, using a single query"""
+    details = {}
+    for page in ec2_client.get_paginator("describe_instances").paginate(InstanceIds=list(instances.values())):
+        for reservation in page["Reservations"]:
+            for instance in reservation["Instances"]:
+                # the DNS name may be missing if the VPC does not assign one
+                details[instance["InstanceId"]] = Node(instance.get("PublicDnsName") or
+                                                       instance.get("PublicIpAddress", ""),
+                                                       instance.get("PrivateIpAddress", ""))
+    return {role: details.get(instance_id, Node("", "")) for role, instance_id in instances.items()}
+
+
+def node_groups(role):
+    """return the inventory groups the node with the given role belongs to"""
+    groups = []
+    if role == "rhua":
+        groups.append("RHUA")
+        if fs_type == "rhua":
+            groups.append("NFS")
+        if not args.dns:
+            groups.append("DNS")
+    elif role == "nfs" and fs_type == "nfs":
+        groups.append("NFS")
+    elif role == "dns" and args.dns:
+        groups.append("DNS")
+    elif role.startswith("cds"):
+        groups.append("CDS")
+    elif role.startswith("cli"):
+        groups.append("CLI")
+    elif role.startswith("haproxy"):
+        groups.append("HAPROXY")
+    elif role in ("test", "launchpad", "anotherrhua"):
+        groups.append(role.upper())
+    return groups
+
+
+def build_inventory(nodes):
+    """return {group: [Node, ...]} in the order of the sections of the inventory file"""
+    # the sections that are always there, or only if such nodes are requested
+    sections = [("RHUA", True),
+                ("NFS", fs_type in ("rhua", "nfs")),
+                ("CDS", True),
+                ("DNS", True),
+                ("CLI", args.cli6 or args.cli7 or args.cli8 or args.cli9 or args.cli10),
+                ("TEST", args.test),
+                ("HAPROXY", True),
+                ("LAUNCHPAD", args.rhui5launchpad),
+                ("ANOTHERRHUA", args.rhui5rhua)]
+    inventory = {group: [] for group, wanted in sections if wanted}
+    for role, node in nodes.items():
+        for group in node_groups(role):
+            if group in inventory:
+                inventory[group].append(node)
+    return inventory
+
+
+def render_ini(inventory, host_vars):
+    """return the inventory in the INI format"""
+    # the extra arguments are always quoted as they usually contain spaces
+    host_vars_text = "".join(' %s="%s"' % (name, value) if name == "ansible_ssh_extra_args" else
+                             " %s=%s" % (name, value)
+                             for name, value in host_vars.items())
+    return "\n".join("[%s]\n" % group + "".join(node.hostname + host_vars_text + "\n" for node in group_nodes)
+                     for group, group_nodes in inventory.items())
+
+
+def render_yaml(inventory, host_vars):
+    """return the inventory in the YAML format"""
+    children = {group: {"hosts": {node.hostname: None for node in group_nodes}}
+                for group, group_nodes in inventory.items()}
+    tree = {"all": {"children": children}}
+    if host_vars:
+        tree["all"]["vars"] = host_vars
+    return yaml.safe_dump(tree, default_flow_style=False, sort_keys=False)
+
+
+def render_etc_hosts(inventory):
+    """return the private addresses and names of the nodes like in /etc/hosts on the nodes"""
+    # the same names as in deploy/roles/common/templates/hosts.j2
+    lines = []
+    for group, short_name in [("TEST", "test"), ("NFS", "nfs"), ("RHUA", "rhua")]:
+        if inventory.get(group):
+            lines.append("%s %s %s.example.com" % (inventory[group][0].private_ip, short_name, short_name))
+    for group, short_name in [("DNS", "ns"), ("CDS", "cds"), ("HAPROXY", "hap"), ("CLI", "cli")]:
+        for index, node in enumerate(inventory.get(group, []), 1):
+            lines.append("%s %s0%i %s0%i.example.com" % (node.private_ip, short_name, index, short_name, index))
+    if inventory.get("HAPROXY"):
+        lines.append("%s lb lb.example.com" % inventory["HAPROXY"][0].private_ip)
+    return "\n".join(lines) + "\n"
+
+
 cf_client = boto3.client("cloudformation", region_name=args.region)
 cf_client.create_stack(StackName=STACK_ID,
                        TemplateBody=json_body,
                        Parameters=parameters,
                        TimeoutInMinutes=args.timeout)
 
-is_complete = False
-success = False
-while not is_complete:
-    time.sleep(10)
-    response = cf_client.describe_stacks(StackName=STACK_ID)
-    status = response["Stacks"][0]["StackStatus"]
-    if status == "CREATE_IN_PROGRESS":
-        continue
-    if status == "CREATE_COMPLETE":
-        logging.info("Stack creation completed")
-        is_complete = True
-        success = True
-    elif status in ("ROLLBACK_IN_PROGRESS", "ROLLBACK_COMPLETE"):
-        logging.info("Stack creation failed: %s", status)
-        is_complete = True
-    else:
-        logging.error("Unexpected stack status: %s", status)
-        break
-
-if not success:
+if not wait_for_stack(cf_client, STACK_ID, args.timeout):
     print("Review the stack in the CloudFormation console and diagnose the reason.")
     print("Be sure to delete the stack. Even stacks that were rolled back still consume resources!")
     sys.exit(1)
 
 # obtain information about the stack
 resources = cf_client.describe_stack_resources(StackName=STACK_ID)
-# create a dict with items such as haproxy1EIP: 50:60:70:80
-ip_addresses = {resource["LogicalResourceId"]: resource["PhysicalResourceId"] \
-                for resource in resources['StackResources'] \
-                if resource["ResourceType"] == "AWS::EC2::EIP"}
-# create another, more useful dict with roles: hostnames
-hostnames = {lri.replace("EIP", ""): socket.getfqdn(ip) \
-             for lri, ip in ip_addresses.items()}
+# create a dict with items such as haproxy1: i-0123456789abcdef0
+instances = {resource["LogicalResourceId"]: resource["PhysicalResourceId"] \
+             for resource in resources['StackResources'] \
+             if resource["ResourceType"] == "AWS::EC2::Instance"}
+# create another, more useful dict with roles: hostnames and addresses
+nodes = get_nodes(boto3.client("ec2", region_name=args.region), instances)
 # also create a list of instance IDs to print in the end
-instance_ids = [resource["PhysicalResourceId"] \
-                for resource in resources['StackResources'] \
-                if resource["ResourceType"] == "AWS::EC2::Instance"]
+instance_ids = list(instances.values())
+
+inventory = build_inventory(nodes)
+host_vars = {}
+if ssh_key:
+    host_vars["ansible_ssh_private_key_file"] = ssh_key
+if args.ansible_ssh_extra_args:
+    host_vars["ansible_ssh_extra_args"] = args.ansible_ssh_extra_args
 
 # output file
 if args.output_conf:
@@ -525,129 +652,18 @@ if args.output_conf:
 else:
     outfile = concat_name(cfgfile=True)
 
-try:
-    with open(outfile, 'w') as f:
-        f.write('[RHUA]\n')
-        for role, hostname in hostnames.items():
-            if role == "rhua":
-                f.write(hostname)
-                if ssh_key:
-                    f.write(' ansible_ssh_private_key_file=%s' % ssh_key)
-                if args.ansible_ssh_extra_args:
-                    f.write(' ansible_ssh_extra_args="%s"' % args.ansible_ssh_extra_args)
-                f.write('\n')
-        # rhua as nfs
-        if fs_type == "rhua":
-            f.write('\n[NFS]\n')
-            for role, hostname in hostnames.items():
-                if role == "rhua":
-                    f.write(hostname)
-                    if ssh_key:
-                        f.write(' ansible_ssh_private_key_file=%s' % ssh_key)
-                    if args.ansible_ssh_extra_args:
-                        f.write(' ansible_ssh_extra_args="%s"' % args.ansible_ssh_extra_args)
-                    f.write('\n')
-        # nfs
-        elif fs_type == "nfs":
-            f.write('\n[NFS]\n')
-            for role, hostname in hostnames.items():
-                if role == "nfs":
-                    f.write(hostname)
-                    if ssh_key:
-                        f.write(' ansible_ssh_private_key_file=%s' % ssh_key)
-                    if args.ansible_ssh_extra_args:
-                        f.write(' ansible_ssh_extra_args="%s"' % args.ansible_ssh_extra_args)
-                    f.write('\n')
-        # cdses
-        f.write('\n[CDS]\n')
-        for role, hostname in hostnames.items():
-            if role.startswith("cds"):
-                f.write(hostname)
-                if ssh_key:
-                    f.write(' ansible_ssh_private_key_file=%s' % ssh_key)
-                if args.ansible_ssh_extra_args:
-                    f.write(' ansible_ssh_extra_args="%s"' % args.ansible_ssh_extra_args)
-                f.write('\n')
-        # dns
-        f.write('\n[DNS]\n')
-        if args.dns:
-            for role, hostname in hostnames.items():
-                if role == "dns":
-                    f.write(hostname)
-                    if ssh_key:
-                        f.write(' ansible_ssh_private_key_file=%s' % ssh_key)
-                    if args.ansible_ssh_extra_args:
-                        f.write(' ansible_ssh_extra_args="%s"' % args.ansible_ssh_extra_args)
-                    f.write('\n')
-        else:
-            for role, hostname in hostnames.items():
-                if role == "rhua":
-                    f.write(hostname)
-                    if ssh_key:
-                        f.write(' ansible_ssh_private_key_file=%s' % ssh_key)
-                    if args.ansible_ssh_extra_args:
-                        f.write(' ansible_ssh_extra_args="%s"' % args.ansible_ssh_extra_args)
-                    f.write('\n')
-        # cli
-        if args.cli6 or args.cli7 or args.cli8 or args.cli9 or args.cli10:
-            f.write('\n[CLI]\n')
-            for role, hostname in hostnames.items():
-                if role.startswith("cli"):
-                    f.write(hostname)
-                    if ssh_key:
-                        f.write(' ansible_ssh_private_key_file=%s' % ssh_key)
-                    if args.ansible_ssh_extra_args:
-                        f.write(' ansible_ssh_extra_args="%s"' % args.ansible_ssh_extra_args)
-                    f.write('\n')
-        # test
-        if args.test:
-            f.write('\n[TEST]\n')
-            for role, hostname in hostnames.items():
-                if role == "test":
-                    f.write(hostname)
-                    if ssh_key:
-                        f.write(' ansible_ssh_private_key_file=%s' % ssh_key)
-                    if args.ansible_ssh_extra_args:
-                        f.write(' ansible_ssh_extra_args="%s"' % args.ansible_ssh_extra_args)
-                    f.write('\n')
-        # haproxy
-        f.write('\n[HAPROXY]\n')
-        for role, hostname in hostnames.items():
-            if role.startswith("haproxy"):
-                f.write(hostname)
-                if ssh_key:
-                    f.write(' ansible_ssh_private_key_file=%s' % ssh_key)
-                if args.ansible_ssh_extra_args:
-                    f.write(' ansible_ssh_extra_args="%s"' % args.ansible_ssh_extra_args)
-                f.write('\n')
-        # RHUI 5 launchpad
-        if args.rhui5launchpad:
-            f.write('\n[LAUNCHPAD]\n')
-            for role, hostname in hostnames.items():
-                if role == "launchpad":
-                    f.write(hostname)
-                    if ssh_key:
-                        f.write(' ansible_ssh_private_key_file=%s' % ssh_key)
-                    if args.ansible_ssh_extra_args:
-                        f.write(' ansible_ssh_extra_args="%s"' % args.ansible_ssh_extra_args)
-                    f.write('\n')
-
-        # RHUI 5 RHUA
-        if args.rhui5rhua:
-            f.write('\n[ANOTHERRHUA]\n')
-            for role, hostname in hostnames.items():
-                if role == "anotherrhua":
-                    f.write(hostname)
-                    if ssh_key:
-                        f.write(' ansible_ssh_private_key_file=%s' % ssh_key)
-                    if args.ansible_ssh_extra_args:
-                        f.write(' ansible_ssh_extra_args="%s"' % args.ansible_ssh_extra_args)
-                    f.write('\n')
-
-
-except Exception as e:
-    logging.error("got '%s' error processing: %s", e, args.output_conf)
-    sys.exit(1)
+outputs = [(outfile, render_ini(inventory, host_vars))]
+if args.output_yaml:
+    outputs.append((args.output_yaml, render_yaml(inventory, host_vars)))
+if args.output_hosts:
+    outputs.append((args.output_hosts, render_etc_hosts(inventory)))
+for output, contents in outputs:
+    try:
+        with open(output, 'w') as f:
+            f.write(contents)
+    except Exception as e:
+        logging.error("got '%s' error processing: %s", e, output)
+        sys.exit(1)
 
 print("Instance IDs:")
 print(" ".join(instance_ids))
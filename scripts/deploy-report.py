@@ -0,0 +1,132 @@
+#!/usr/bin/python
+"""Rank the slowest parts of a RHUI deployment and compare them with previous deployments"""
+
+import argparse
+from collections import defaultdict
+import json
+from os import listdir
+from os.path import basename, expanduser, isdir, join, normpath
+from statistics import median
+import sys
+
+PRS = argparse.ArgumentParser(description="Show which tasks, roles or hosts took the most time " +
+                              "in a deployment done with scripts/deploy.py.",
+                              formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+PRS.add_argument("deployment",
+                 help="directory with the task durations of the deployment, or its name " +
+                 "in the timing directory; the latest deployment by default",
+                 nargs="?")
+PRS.add_argument("--timing-dir",
+                 help="directory with the task durations of all deployments",
+                 default="~/.cache/rhui4-automation/deployments",
+                 metavar="dir")
+PRS.add_argument("--by",
+                 help="what to rank",
+                 choices=["task", "role", "host"],
+                 default="task")
+PRS.add_argument("--top",
+                 help="how many of the slowest items to show",
+                 type=int,
+                 default=20)
+PRS.add_argument("--previous",
+                 help="how many of the previous deployments to compare with",
+                 type=int,
+                 default=5)
+ARGS = PRS.parse_args()
+
+def fmt_time(seconds):
+    """return a human-readable duration"""
+    seconds = round(seconds)
+    return f"{seconds // 60}m{seconds % 60:02d}s"
+
+def fmt_change(seconds):
+    """return a human-readable signed difference"""
+    return ("+" if seconds >= 0 else "-") + fmt_time(abs(seconds))
+
+def load_deployment(path):
+    """return the list of playbook timings (one per playbook run) in the directory"""
+    playbooks = []
+    for name in sorted(listdir(path)):
+        if name.endswith(".json"):
+            with open(join(path, name), encoding="utf-8") as timing_file:
+                playbooks.append(json.load(timing_file))
+    return playbooks
+
+def aggregate(playbooks, by):
+    """return {item: [total duration, slowest host, its duration]} for the playbook timings"""
+    totals = defaultdict(lambda: [0.0, "", 0.0])
+    for playbook in playbooks:
+        for task in playbook["tasks"]:
+            if by == "host":
+                for host, result in task["hosts"].items():
+                    totals[host][0] += result["duration"]
+                continue
+            if by == "task":
+                item = f"{task['role'] or task['play']}: {task['name']}"
+            else:
+                item = task["role"] or f"({task['play']})"
+            totals[item][0] += task["duration"]
+            for host, result in task["hosts"].items():
+                if result["duration"] > totals[item][2]:
+                    totals[item][1:] = [host, result["duration"]]
+    return totals
+
+def wall_clock(playbooks):
+    """return the time from the start of the first playbook to the end of the last one"""
+    return max(playbook["started"] + playbook["duration"] for playbook in playbooks) - \
+           min(playbook["started"] for playbook in playbooks)
+
+TIMING_DIR = expanduser(ARGS.timing_dir)
+try:
+    DEPLOYMENTS = sorted(name for name in listdir(TIMING_DIR) if isdir(join(TIMING_DIR, name)))
+except FileNotFoundError:
+    DEPLOYMENTS = []
+if ARGS.deployment:
+    DEPLOYMENT_DIR = ARGS.deployment if isdir(ARGS.deployment) else join(TIMING_DIR,
+                                                                        ARGS.deployment)
+elif DEPLOYMENTS:
+    DEPLOYMENT_DIR = join(TIMING_DIR, DEPLOYMENTS[-1])
+else:
+    print(f"There are no deployments in {TIMING_DIR}.")
+    sys.exit(1)
+
+DEPLOYMENT = basename(normpath(DEPLOYMENT_DIR))
+try:
+    PLAYBOOKS = load_deployment(DEPLOYMENT_DIR)
+except (OSError, ValueError) as err:
+    print(f"Cannot read {DEPLOYMENT_DIR}: {err}")
+    sys.exit(1)
+if not PLAYBOOKS:
+    print(f"{DEPLOYMENT_DIR} contains no task durations.")
+    sys.exit(1)
+
+# deployments are named by their start time, so the earlier ones sort first
+PREVIOUS = [name for name in DEPLOYMENTS if name < DEPLOYMENT][-ARGS.previous:] \
+           if ARGS.previous > 0 else []
+HISTORY = defaultdict(list)
+for name in PREVIOUS:
+    try:
+        for item, (duration, _, _) in aggregate(load_deployment(join(TIMING_DIR, name)),
+                                                ARGS.by).items():
+            HISTORY[item].append(duration)
+    except (OSError, ValueError) as err:
+        print(f"Skipping {name}: {err}", file=sys.stderr)
+
+TOTALS = aggregate(PLAYBOOKS, ARGS.by)
+TOTAL = sum(duration for duration, _, _ in TOTALS.values()) or 1
+print(f"Deployment {DEPLOYMENT}: {fmt_time(wall_clock(PLAYBOOKS))} wall clock time, " +
+      f"{', '.join(playbook['playbook'] for playbook in PLAYBOOKS)}; " +
+      f"compared with {len(PREVIOUS)} previous deployment(s)")
+print(f"{'#':>3} {'time':>8} {'share':>5} {'before':>8} {'change':>8}  " +
+      ("" if ARGS.by == "host" else f"{'slowest host':<40}") + ARGS.by)
+RANKED = sorted(TOTALS.items(), key=lambda item: -item[1][0])[:ARGS.top]
+for rank, (item, (duration, host, host_duration)) in enumerate(RANKED, 1):
+    if HISTORY[item]:
+        before = median(HISTORY[item])
+        comparison = f"{fmt_time(before):>8} {fmt_change(duration - before):>8}"
+    else:
+        comparison = f"{'-':>8} {'new' if PREVIOUS else '-':>8}"
+    slowest = "" if ARGS.by == "host" else \
+              f"{host + ' (' + fmt_time(host_duration) + ')' if host else '-':<40}"
+    print(f"{rank:>3} {fmt_time(duration):>8} {duration * 100 / TOTAL:>4.0f}% {comparison}  " +
+          f"{slowest}{item}")
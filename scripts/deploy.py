@@ -1,13 +1,38 @@
 #!/usr/bin/python
 """RHUI 4 Automation Deployment Made Easy"""
 
-from os import system
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from os import environ, makedirs, system
 from os.path import exists, expanduser, join
+import subprocess
 import sys
+import time
 
 import argparse
 from configparser import RawConfigParser
 
+# the callback plugin in deploy/callback_plugins saves the task durations to this file
+TIMING_ENV = "RHUI_DEPLOY_TIMING_FILE"
+
+# playbooks that can run on their own, the stages they need to have finished first,
+# and the inventory groups they run on (or on which they make changes); in the site.yml order
+Stage = namedtuple("Stage", ["name", "playbook", "needs", "groups"])
+# with --dns, all the nodes use the DNS server as soon as the base stage is done,
+# so nothing else can install packages until the server is running
+STAGES = [Stage("base", "base.yml", [], ["all"]),
+          Stage("dns", "dns.yml", ["base"], ["DNS"]),
+          Stage("filesystem", "filesystem.yml", ["base", "dns"], ["NFS"]),
+          # the installer mounts the NFS share; the RHUA key is authorized on CDSes and HAProxies
+          # by tasks delegated to them, so their own playbooks must not run at the same time
+          Stage("rhua", "rhua.yml", ["filesystem", "dns"], ["RHUA", "CDS", "HAPROXY"]),
+          Stage("haproxy", "haproxy.yml", ["base", "dns"], ["HAPROXY"]),
+          Stage("cds", "cds.yml", ["base", "dns"], ["CDS"]),
+          Stage("cli", "cli.yml", ["base", "dns"], ["CLI"]),
+          Stage("customize", "customize.yml",
+                ["dns", "filesystem", "haproxy", "cds", "cli", "rhua"], ["all"]),
+          Stage("tests", "tests.yml", ["customize"], ["all"])]
+
 # there can be configuration to complement some options
 CFG_FILE = "~/.rhui4-automation.cfg"
 R4A_CFG = RawConfigParser()
@@ -92,6 +117,19 @@ PRS.add_argument("--skip-tags",
                  metavar="tags")
 PRS.add_argument("--extra-vars",
                  help="supply these variables to Ansible")
+PRS.add_argument("--staged",
+                 help="run the playbooks separately, those independent of each other at the same " +
+                 "time, each with its own log",
+                 action="store_true")
+PRS.add_argument("--log-dir",
+                 help="directory for the logs in the staged mode; " +
+                 "/tmp/rhui4_deploy_DATE by default",
+                 metavar="dir")
+PRS.add_argument("--timing-dir",
+                 help="directory to save the durations of the tasks in each deployment to, " +
+                 "for scripts/deploy-report.py",
+                 default="~/.cache/rhui4-automation/deployments",
+                 metavar="dir")
 PRS.add_argument("--dry-run",
                  help="only construct and print the ansible-playbook command, do not run it",
                  action="store_true")
@@ -147,8 +185,82 @@ if ARGS.container_client_rpm:
         print(f"{ARGS.container_client_rpm} is not a file, exiting.")
         sys.exit(1)
 
+def read_groups(inventory):
+    """return {group: set of hosts} from the INI inventory, including the "all" group"""
+    groups = {"all": set()}
+    group = None
+    with open(inventory, encoding="utf-8") as inventory_file:
+        for line in inventory_file:
+            line = line.strip()
+            if line.startswith("["):
+                group = line.strip("[]")
+                # variables and children are not hosts
+                if ":" in group:
+                    group = None
+                else:
+                    groups.setdefault(group, set())
+            elif group and line and not line.startswith(("#", ";")):
+                host = line.split()[0]
+                groups[group].add(host)
+                groups["all"].add(host)
+    return groups
+
+def fmt_time(seconds):
+    """return a human-readable duration"""
+    return f"{int(seconds) // 60}m{int(seconds) % 60:02d}s"
+
+def run_stage(stage, cmd, log_dir, timing_dir):
+    """run the stage's playbook with the output going to a log file, return the exit status"""
+    env = dict(environ, **{TIMING_ENV: join(timing_dir, f"{stage.name}.json")})
+    with open(join(log_dir, f"{stage.name}.log"), "w", encoding="utf-8") as log:
+        return subprocess.run(cmd, shell=True, stdout=log, stderr=subprocess.STDOUT, env=env,
+                              check=False).returncode
+
+def run_stages(stages, commands, hosts, log_dir, timing_dir):
+    """run the stages as soon as what they need has succeeded, return {stage: (status, time)}
+
+    stages that would make changes on the same hosts run one after another in the given order,
+    so that e.g. the hostname of a node with several roles is the same as with site.yml
+    """
+    results = {}
+    pending = list(stages)
+    running = {}
+    started = {}
+    with ThreadPoolExecutor(max_workers=len(stages)) as executor:
+        while pending or running:
+            for stage in list(pending):
+                if any(results.get(need, ("", None))[0] in ("failed", "skipped")
+                       for need in stage.needs):
+                    pending.remove(stage)
+                    results[stage.name] = ("skipped", None)
+                    print(f"{stage.name}: skipped")
+                elif all(need in results for need in stage.needs if need in commands) and \
+                     not any(hosts[stage.name] & hosts[other.name]
+                             for other in list(running.values()) + pending[:pending.index(stage)]):
+                    pending.remove(stage)
+                    print(f"{stage.name}: started")
+                    started[stage.name] = time.monotonic()
+                    running[executor.submit(run_stage, stage, commands[stage.name], log_dir,
+                                            timing_dir)] = \
+                        stage
+            if not running:
+                # nothing can start and nothing is running, which should not happen
+                for stage in pending:
+                    results[stage.name] = ("skipped", None)
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                duration = time.monotonic() - started[stage.name]
+                status = "ok" if future.result() == 0 else "failed"
+                results[stage.name] = (status, duration)
+                print(f"{stage.name}: {status} in {fmt_time(duration)}" +
+                      (f", see {join(log_dir, stage.name + '.log')}" if status == "failed" else ""))
+    return results
+
 # start building the command
-CMD = f"ansible-playbook -i {ARGS.inventory} deploy/site.yml --extra-vars '"
+PLAYBOOK_CMD = f"ansible-playbook -i {ARGS.inventory} "
+CMD = "--extra-vars '"
 
 # start building the extra variables
 if ARGS.client_rpm:
@@ -255,9 +367,45 @@ if ARGS.tags:
 if ARGS.skip_tags:
     CMD += " --skip-tags " + ARGS.skip_tags
 
+# each deployment gets its own directory with the task durations
+DEPLOYMENT = time.strftime('%F-%T')
+TIMING_DIR = join(expanduser(ARGS.timing_dir), DEPLOYMENT)
+
+# the command is now built; in the staged mode, run it with each playbook
+if ARGS.staged:
+    GROUPS = read_groups(ARGS.inventory)
+    # the DNS server is only set up if requested, the same way as in site.yml
+    STAGES_TO_RUN = [stage for stage in STAGES if stage.name != "dns" or ARGS.dns]
+    COMMANDS = {stage.name: PLAYBOOK_CMD + f"deploy/{stage.playbook} " + CMD
+                for stage in STAGES_TO_RUN}
+    HOSTS = {stage.name: set().union(*(GROUPS.get(group, set()) for group in stage.groups))
+             for stage in STAGES_TO_RUN}
+    if ARGS.dry_run:
+        for stage in STAGES_TO_RUN:
+            needs = [need for need in stage.needs if need in COMMANDS]
+            print(f"DRY RUN: {stage.name} (after: {', '.join(needs) or 'nothing'}) " +
+                  f"would have run: {COMMANDS[stage.name]}")
+        sys.exit(0)
+    LOG_DIR = ARGS.log_dir or f"/tmp/rhui4_deploy_{DEPLOYMENT}"
+    makedirs(LOG_DIR, exist_ok=True)
+    print(f"Running the playbooks in stages, logs in: {LOG_DIR}")
+    START = time.monotonic()
+    RESULTS = run_stages(STAGES_TO_RUN, COMMANDS, HOSTS, LOG_DIR, TIMING_DIR)
+    print(f"Finished in {fmt_time(time.monotonic() - START)}:")
+    for stage in STAGES_TO_RUN:
+        status, duration = RESULTS[stage.name]
+        print(f"* {stage.name}: {status}" +
+              (f" ({fmt_time(duration)})" if duration is not None else ""))
+    print(f"Task durations saved in: {TIMING_DIR}")
+    sys.exit(0 if all(status == "ok" for status, _ in RESULTS.values()) else 1)
+
+CMD = PLAYBOOK_CMD + "deploy/site.yml " + CMD
+
 # the command is now built; print it and then run it (unless in the dry-run mode)
 if ARGS.dry_run:
     print("DRY RUN: would have run: " + CMD)
 else:
     print("Running: " + CMD)
+    environ[TIMING_ENV] = join(TIMING_DIR, "site.json")
     system(CMD)
+    print(f"Task durations saved in: {TIMING_DIR}")
@@ -1,77 +1,254 @@
 #! /usr/bin/python -tt
 """Regenerate a list of AMI IDs based on the given AMI description."""
 
+import os
+import re
 import sys
-import subprocess
 import json
+import time
 import argparse
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from glob import glob
 
-if subprocess.call("which aws &> /dev/null", shell=True):
-    sys.stderr.write("The aws client is not available. Please install package awscli.\n")
-    sys.exit(1)
+import boto3
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
 
-if subprocess.call("aws configure get aws_access_key_id &> /dev/null", shell=True):
-    sys.stderr.write("The aws client is not configured. Please run `aws configure'.\n")
-    sys.exit(1)
+# the AWS account that publishes the RHEL images
+REDHAT_OWNER = "309956199498"
 
-argparser = argparse.ArgumentParser(description='Get a list of AMIs')
-argparser.add_argument('rhel',
-                       help='Description of the AMI \
-                       (e.g. RHEL-7.5_HVM_GA-20180322-x86_64-1-Hourly2-GP2)',
-                       metavar='AMI',
-                       nargs='?')
-argparser.add_argument('--skip-regions',
-                       metavar='list',
-                       help='A comma-separated list of regions to ignore')
+# the region to list the regions in
+HOME_REGION = "us-east-1"
 
-args = argparser.parse_args()
+BOTO_CONFIG = Config(retries={"max_attempts": 10, "mode": "adaptive"})
 
-if not args.rhel:
-    argparser.print_help()
-    sys.exit(1)
+CACHE_FILE = "~/.cache/rhui4-automation/amis.json"
 
-if args.rhel.startswith("RHEL-"):
-    RHEL_VERSION = args.rhel.split(".")[0].replace("-", "")
+MAPPING_FILE = re.compile(r"^RHEL(\d+)mapping(?:_(\w+))?\.json$")
+
+# a mapping file and the image name pattern and architecture to fill it with
+Target = namedtuple("Target", ["mapping", "pattern", "arch"])
+
+
+def parse_description(description):
+    """return the mapping file name and the architecture for the AMI description"""
+    if not description.startswith("RHEL-"):
+        raise ValueError("Wrong parameters")
+    rhel_version = description.split(".")[0].replace("-", "")
+    try:
+        arch = description.split("-")[3]
+    except IndexError as err:
+        raise ValueError("The AMI description may be malformed " +
+                         "or this script may need updating.") from err
+    return f"{rhel_version}mapping{'_' + arch if arch != 'x86_64' else ''}.json", arch
+
+
+def description_target(description, mapping_dir="."):
+    """return the Target for the AMI description"""
+    mapping, arch = parse_description(description)
+    return Target(os.path.join(mapping_dir, mapping), f"*{description}*", arch)
+
+
+def latest_target(mapping):
+    """return the Target to fill the existing mapping file with the latest GA images"""
+    match = MAPPING_FILE.match(os.path.basename(mapping))
+    if not match:
+        raise ValueError(f"{mapping} is not a RHEL<N>mapping[_<arch>].json file")
+    version, arch = match.group(1), match.group(2) or "x86_64"
+    # e.g. RHEL-9.4.0_HVM-20240423-x86_64-62-Hourly2-GP3, but not _HVM_BETA- or Access2 images
+    return Target(mapping, f"RHEL-{version}.*_HVM-*-{arch}-*-Hourly2-*", arch)
+
+
+def get_regions(session, skip_regions=None):
+    """return a sorted list of all regions except the skipped ones"""
+    client = session.client("ec2", region_name=HOME_REGION, config=BOTO_CONFIG)
+    regions = [region["RegionName"]
+               for region in client.describe_regions(AllRegions=True)["Regions"]]
+    return sorted(set(regions) - set(skip_regions or []))
+
+
+def find_ami(client, pattern, arch, owners):
+    """return the ID and the creation date of the newest matching AMI, or empty strings"""
+    # the filtering is done by EC2, so only the matching images are transferred
+    filters = [{"Name": "name", "Values": [pattern]},
+               {"Name": "architecture", "Values": [arch]}]
+    kwargs = {"Filters": filters}
+    if owners:
+        kwargs["Owners"] = owners
+    images = client.describe_images(**kwargs)["Images"]
+    if not images:
+        return "", ""
+    newest = max(images, key=lambda image: image.get("CreationDate", ""))
+    return newest["ImageId"], newest.get("CreationDate", "")
+
+
+def make_clients(session, regions):
+    """return {region: EC2 client} sharing the session"""
+    # clients are thread-safe, but creating them is not, so they are all created here
+    return {region: session.client("ec2", region_name=region, config=BOTO_CONFIG)
+            for region in regions}
+
+
+def cache_key(target, owners):
+    """return the key of the cached results for the target"""
+    return f"{target.pattern}|{target.arch}|{','.join(owners) or 'any'}"
+
+
+def load_json(path):
+    """return the contents of the JSON file, or an empty dict if it does not exist"""
     try:
-        AMI_ARCH = args.rhel.split("-")[3]
-    except IndexError:
-        print("The AMI description may be malformed or this script may need updating.")
+        with open(os.path.expanduser(path), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def is_stale(mapping, entry, region, ttl, now):
+    """return True if the region needs to be queried again for the mapping"""
+    return region not in mapping or not entry or \
+        entry["AMI"] != mapping[region]["AMI"] or now - entry["checked"] > ttl
+
+
+def refresh(clients, targets, mappings, cache, owners, ttl=0, workers=16):
+    """return {mapping file: {region: {"AMI": ID or ""}}} for the targets, querying stale regions
+
+    mappings holds the current contents of the mapping files, and cache the results
+    of the previous queries, which is updated in place; with ttl=0, all regions are queried
+    """
+    now = time.time()
+    jobs = [(target, region) for target in targets for region in sorted(clients)
+            if is_stale(mappings.get(target.mapping, {}),
+                        cache.get(cache_key(target, owners), {}).get(region), region, ttl, now)]
+
+    def query(job):
+        target, region = job
+        try:
+            return job, find_ami(clients[region], target.pattern, target.arch, owners)
+        except (BotoCoreError, ClientError) as err:
+            sys.stderr.write(f"Got '{err}' error for '{region}' region \n")
+            return job, None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(query, jobs))
+
+    new_mappings = {target.mapping: {region: dict(value) for region, value in
+                                     mappings.get(target.mapping, {}).items()}
+                    for target in targets}
+    for (target, region), result in results:
+        if result is None:
+            # keep what is known, but make sure the region is listed
+            new_mappings[target.mapping].setdefault(region, {"AMI": ""})
+            continue
+        ami_id, creation_date = result
+        if not ami_id:
+            # e.g. deprecated images are hidden from other accounts, so an old mapping file
+            # would lose its IDs; keep them, and query the region again next time
+            sys.stderr.write(f"Missing AMI ID for '{region}' region in {target.mapping} \n")
+            new_mappings[target.mapping].setdefault(region, {"AMI": ""})
+            continue
+        new_mappings[target.mapping][region] = {"AMI": ami_id}
+        cache.setdefault(cache_key(target, owners), {})[region] = {"AMI": ami_id,
+                                                                   "CreationDate": creation_date,
+                                                                   "checked": now}
+    sys.stderr.write(f"Queried {len(jobs)} of {len(targets) * len(clients)} " +
+                     "region/image combinations.\n")
+    return new_mappings
+
+
+def write_if_changed(path, mapping, old_mapping):
+    """write the mapping to the file unless it already has this content; return True if written"""
+    if mapping == old_mapping:
+        return False
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(mapping, f, indent=4, sort_keys=True)
+    return True
+
+
+def main():
+    """parse the arguments and write the mapping files"""
+    argparser = argparse.ArgumentParser(description='Get a list of AMIs')
+    argparser.add_argument('rhel',
+                           help='Description of the AMI \
+                           (e.g. RHEL-7.5_HVM_GA-20180322-x86_64-1-Hourly2-GP2); \
+                           can be repeated',
+                           metavar='AMI',
+                           nargs='*')
+    argparser.add_argument('--all',
+                           help='refresh all the existing mapping files with the latest GA images \
+                           (implies --incremental)',
+                           action='store_true')
+    argparser.add_argument('--incremental',
+                           help='only query the regions that are missing in the mapping files \
+                           or whose cached results are older than the TTL',
+                           action='store_true')
+    argparser.add_argument('--ttl',
+                           help='how long (in hours) cached results are valid \
+                           (default: %(default)s)',
+                           type=float,
+                           default=24)
+    argparser.add_argument('--cache-file',
+                           help='file to cache the results in (default: %(default)s)',
+                           default=CACHE_FILE)
+    argparser.add_argument('--mapping-dir',
+                           help='directory with the mapping files (default: %(default)s)',
+                           default='.')
+    argparser.add_argument('--skip-regions',
+                           metavar='list',
+                           help='A comma-separated list of regions to ignore')
+    argparser.add_argument('--owner',
+                           help='ID of the account that owns the AMIs, or "any" \
+                           (default: %(default)s, i.e. Red Hat)',
+                           default=REDHAT_OWNER)
+    argparser.add_argument('--workers',
+                           help='number of regions to query at the same time \
+                           (default: %(default)s)',
+                           type=int,
+                           default=16)
+
+    args = argparser.parse_args()
+
+    if not args.rhel and not args.all:
+        argparser.print_help()
         sys.exit(1)
-    MAPPING = f"{RHEL_VERSION}mapping{'_' + AMI_ARCH if AMI_ARCH != 'x86_64' else ''}.json"
-else:
-    sys.stderr.write("Wrong parameters")
-    sys.exit(1)
-
-CMD = "aws ec2 describe-regions " \
-      "--all-regions " \
-      "--query 'Regions[].{Name:RegionName}' " \
-      "--output text"
-cmd_out = subprocess.check_output(CMD, shell=True)
-regions = cmd_out.decode().splitlines()
-
-if args.skip_regions:
-    for region in args.skip_regions.split(','):
-        regions.remove(region)
-
-CMD = "aws ec2 describe-images " \
-      "--filters Name=name,Values=*{0}* " \
-      "--query Images[*].ImageId --region {1}"
-
-out_dict = {}
-
-for i in regions:
-    print(CMD.format(args.rhel, i))
-    ami = subprocess.Popen(CMD.format(args.rhel, i).split(), stdout=subprocess.PIPE)
-    out, err = ami.communicate()
-    js = json.loads(out)
+
     try:
-        AMI_ID = js[0]
-    except IndexError as err:
-        sys.stderr.write(f"Got '{err}' error \n")
-        sys.stderr.write(f"Missing AMI ID for '{i}' region \n \n")
-        AMI_ID = ""
-    out_dict[i] = {}
-    out_dict[i]["AMI"] = AMI_ID
-
-with open(MAPPING, "w", encoding="utf-8") as f:
-    json.dump(out_dict, f, indent=4, sort_keys=True)
+        targets = [description_target(description, args.mapping_dir) for description in args.rhel]
+        if args.all:
+            targets += [latest_target(mapping) for mapping in
+                        sorted(glob(os.path.join(args.mapping_dir, "RHEL*mapping*.json")))
+                        if mapping not in [target.mapping for target in targets]]
+    except ValueError as err:
+        sys.stderr.write(f"{err}\n")
+        sys.exit(1)
+
+    session = boto3.session.Session()
+    if not session.get_credentials():
+        sys.stderr.write("AWS credentials are not configured. Please run `aws configure'.\n")
+        sys.exit(1)
+
+    regions = get_regions(session, args.skip_regions.split(',') if args.skip_regions else None)
+    owners = [] if args.owner == "any" else [args.owner]
+    incremental = args.incremental or args.all
+    mappings = {target.mapping: load_json(target.mapping) for target in targets}
+    cache = load_json(args.cache_file)
+    new_mappings = refresh(make_clients(session, regions),
+                           targets,
+                           mappings if incremental else {},
+                           cache,
+                           owners,
+                           args.ttl * 3600 if incremental else 0,
+                           args.workers)
+
+    for mapping, new_mapping in new_mappings.items():
+        written = write_if_changed(mapping, new_mapping, mappings[mapping])
+        print(f"{mapping}: {'updated' if written else 'unchanged'}")
+
+    cache_file = os.path.expanduser(args.cache_file)
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    with open(cache_file, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=1, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Offline Tests for the Refreshing of AMI Lists in get_amis_list.py"""
+
+# No AWS account is needed: the EC2 responses are stubbed. Run:
+# nosetests -v scripts/test_get_amis_list.py
+
+from contextlib import redirect_stderr
+from io import StringIO
+
+import boto3
+from botocore.stub import Stubber
+import nose
+
+import get_amis_list
+
+REGIONS = ["eu-west-1", "us-east-1"]
+TARGET = get_amis_list.latest_target("RHEL9mapping.json")
+OWNERS = [get_amis_list.REDHAT_OWNER]
+TTL = 3600
+
+def _clients():
+    """return {region: EC2 client} with fake credentials, and a stubber for each client"""
+    session = boto3.session.Session(aws_access_key_id="testing",
+                                    aws_secret_access_key="testing")
+    clients = get_amis_list.make_clients(session, REGIONS)
+    return clients, {region: Stubber(client) for region, client in clients.items()}
+
+def _expect_query(stubber, region):
+    """make the stubbed client answer one query for the target with an AMI in the region"""
+    stubber.add_response("describe_images",
+                         {"Images": [{"ImageId": f"ami-{region}",
+                                      "CreationDate": "2024-04-23T00:00:00.000Z"}]},
+                         {"Filters": [{"Name": "name", "Values": [TARGET.pattern]},
+                                      {"Name": "architecture", "Values": [TARGET.arch]}],
+                          "Owners": OWNERS})
+
+def _refresh(clients, mappings, cache):
+    """refresh the target's mapping incrementally, return the new mappings and the log"""
+    log = StringIO()
+    with redirect_stderr(log):
+        new_mappings = get_amis_list.refresh(clients, [TARGET], mappings, cache, OWNERS, TTL)
+    return new_mappings, log.getvalue()
+
+def test_01_first_refresh_queries_all_regions():
+    """check that all the regions are queried when nothing is known about them"""
+    clients, stubbers = _clients()
+    for region, stubber in stubbers.items():
+        _expect_query(stubber, region)
+        stubber.activate()
+    cache = {}
+    new_mappings, log = _refresh(clients, {}, cache)
+    for stubber in stubbers.values():
+        stubber.assert_no_pending_responses()
+    nose.tools.ok_("Queried 2 of 2 " in log, msg=log)
+    nose.tools.eq_(new_mappings[TARGET.mapping],
+                   {region: {"AMI": f"ami-{region}"} for region in REGIONS})
+    nose.tools.eq_(sorted(cache[get_amis_list.cache_key(TARGET, OWNERS)]), REGIONS)
+
+def test_02_refresh_within_ttl_queries_no_region():
+    """check that no region is queried again while the cached results are valid"""
+    clients, stubbers = _clients()
+    for region, stubber in stubbers.items():
+        _expect_query(stubber, region)
+        stubber.activate()
+    cache = {}
+    mappings, _ = _refresh(clients, {}, cache)
+    # any unexpected query would now fail, as the stubbers have no responses left
+    new_mappings, log = _refresh(clients, mappings, cache)
+    nose.tools.ok_("Queried 0 of 2 " in log, msg=log)
+    nose.tools.eq_(new_mappings, mappings)
+
+def test_03_refresh_after_ttl_queries_all_regions():
+    """check that the regions are queried again when the cached results expire"""
+    clients, stubbers = _clients()
+    for region, stubber in stubbers.items():
+        _expect_query(stubber, region)
+        _expect_query(stubber, region)
+        stubber.activate()
+    cache = {}
+    mappings, _ = _refresh(clients, {}, cache)
+    for region_results in cache.values():
+        for result in region_results.values():
+            result["checked"] -= TTL + 1
+    _, log = _refresh(clients, mappings, cache)
+    for stubber in stubbers.values():
+        stubber.assert_no_pending_responses()
+    nose.tools.ok_("Queried 2 of 2 " in log, msg=log)
+
+def test_04_no_image_keeps_the_known_ami():
+    """check that a region whose query finds no image keeps the AMI from the mapping file"""
+    clients, stubbers = _clients()
+    for stubber in stubbers.values():
+        stubber.add_response("describe_images", {"Images": []})
+        stubber.activate()
+    mappings = {TARGET.mapping: {region: {"AMI": f"ami-old-{region}"} for region in REGIONS}}
+    cache = {}
+    new_mappings, log = _refresh(clients, mappings, cache)
+    nose.tools.ok_("Missing AMI ID" in log, msg=log)
+    nose.tools.eq_(new_mappings, mappings)
+    nose.tools.eq_(cache, {})
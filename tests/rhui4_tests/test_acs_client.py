@@ -1,10 +1,11 @@
 """ACS Client Tests"""
 
-# To skip the registration of CDS and HAProxy nodes --
-# because you want to save time in each client test case and do this beforehand -- run:
-# export RHUISKIPSETUP=1
-# in your shell before running this script.
-# The cleanup will be skipped, too, so you ought to clean up eventually.
+# The setup steps (logging in, uploading an entitlement certificate, registering CDS and HAProxy
+# nodes) are only performed if they have not been done yet, e.g. by rhuitestsetup.
+# To keep the certificate and the nodes for other test cases, run:
+# export RHUIDEFERCLEANUP=1
+# in your shell before running this script. (RHUISKIPSETUP=1 has the same effect.)
+# The cleanup will be skipped, so you ought to clean up eventually, e.g. by rhuitestcleanup.
 
 from os import getenv
 from os.path import basename
@@ -16,14 +17,15 @@ from stitches.expect import Expect
 import yaml
 
 from rhui4_tests_lib.conmgr import ConMgr
-from rhui4_tests_lib.rhuimanager import RHUIManager
 from rhui4_tests_lib.rhuimanager_cmdline import RHUIManagerCLI
-from rhui4_tests_lib.rhuimanager_cmdline_instance import RHUIManagerCLIInstance
+from rhui4_tests_lib.rhuisetup import RHUISetup
 from rhui4_tests_lib.util import Util
 from rhui4_tests_lib.yummy import Yummy
 
 logging.basicConfig(level=logging.DEBUG)
 
+# __fixtures: cert cds haproxy
+# __depends: rhua cds haproxy cli
 RHUA = ConMgr.connect()
 # __reusable_clients_with_cds
 # To make this script communicate with a client machine different from cli01.example.com, run:
@@ -55,15 +57,11 @@ class TestACSClient():
     @staticmethod
     def test_01_setup():
         """log in to RHUI, add CDS & HAProxy nodes"""
-        if not getenv("RHUISKIPSETUP"):
-            RHUIManager.initial_run(RHUA)
-            RHUIManagerCLIInstance.add(RHUA, "cds", unsafe=True)
-            RHUIManagerCLIInstance.add(RHUA, "haproxy", unsafe=True)
+        RHUISetup.ensure(RHUA, cert="")
 
     def test_02_add_repos(self):
         """add a Red Hat and create a custom repo"""
-        if not getenv("RHUISKIPSETUP"):
-            RHUIManagerCLI.cert_upload(RHUA)
+        RHUISetup.ensure(RHUA, cds_hostnames=[], haproxy=False)
         RHUIManagerCLI.repo_add_by_repo(RHUA, [self.rh_repo_id], True)
         RHUIManagerCLI.repo_create_custom(RHUA, self.custom_repo_id, protected=True)
 
@@ -138,11 +136,7 @@ class TestACSClient():
         for repo in [self.rh_repo_id, self.custom_repo_id]:
             RHUIManagerCLI.repo_delete(RHUA, repo)
         # uninstall HAProxy & CDS, forget their keys
-        if not getenv("RHUISKIPSETUP"):
-            RHUIManager.remove_rh_certs(RHUA)
-            RHUIManagerCLIInstance.delete(RHUA, "haproxy", force=True)
-            RHUIManagerCLIInstance.delete(RHUA, "cds", force=True)
-            ConMgr.remove_ssh_keys(RHUA)
+        RHUISetup.cleanup(RHUA)
 
     @staticmethod
     def teardown_class():
@@ -20,6 +20,7 @@ CDS2_EXISTS = len(CDS_HOSTNAMES) > 1
 
 HA_HOSTNAME = ConMgr.get_lb_hostname()
 
+# __depends: rhua cds haproxy
 RHUA = ConMgr.connect()
 CDS = ConMgr.connect(CDS_HOSTNAMES[0])
 HAPROXY = ConMgr.connect(HA_HOSTNAME)
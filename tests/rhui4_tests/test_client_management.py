@@ -38,8 +38,11 @@ from rhui4_tests_lib.yummy import Yummy
 logging.basicConfig(level=logging.DEBUG)
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# __fixtures: cert cds haproxy
+# __depends: rhua cds haproxy cli
 RHUA = ConMgr.connect()
 # __reusable_clients_with_cds
+# __exclusive
 # To make this script communicate with a client machine different from cli01.example.com, run:
 # export RHUICLI=hostname
 # in your shell before running this script, replacing "hostname" with the actual client host name.
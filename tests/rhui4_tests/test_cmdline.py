@@ -14,8 +14,10 @@ import nose
 from stitches.expect import Expect
 import yaml
 
+from rhui4_tests_lib.artifacts import Artifacts
 from rhui4_tests_lib.cfg import Config, RHUI_ROOT
 from rhui4_tests_lib.conmgr import ConMgr, USER_NAME
+from rhui4_tests_lib.pulp_api import PulpAPI
 from rhui4_tests_lib.rhuimanager import RHUIManager
 from rhui4_tests_lib.rhuimanager_cmdline import RHUIManagerCLI, \
                                                 CustomRepoAlreadyExists, \
@@ -26,6 +28,7 @@ from rhui4_tests_lib.util import Util
 
 logging.basicConfig(level=logging.DEBUG)
 
+# __depends: rhua haproxy
 RHUA = ConMgr.connect()
 CUSTOM_REPOS = ["my_custom_repo", "another_custom_repo", "yet_another_custom_repo"]
 CR_NAMES = [cr.replace("_", " ").title() for cr in CUSTOM_REPOS]
@@ -242,10 +245,11 @@ class TestCLI():
 
     def test_17_check_package_in_repo(self):
         '''check a random package in the repo'''
-        package_list = RHUIManagerCLI.packages_list(RHUA, self.yum_repo_ids[1])
-        test_package_list = [package for package in package_list if package.startswith(TEST_RH_RPM)]
-        nose.tools.ok_(test_package_list,
-                       msg=f"no {TEST_RH_RPM}* in {package_list}")
+        # any package whose name starts with the test name will do
+        names = [package.name for package in
+                 PulpAPI.list_packages(RHUA, self.yum_repo_ids[1], fields=["name"])]
+        nose.tools.ok_([name for name in names if name.startswith(TEST_RH_RPM)],
+                       msg=f"no {TEST_RH_RPM}* in {self.yum_repo_ids[1]}")
 
     def test_18_list_labels(self):
         '''check repo labels'''
@@ -565,8 +569,8 @@ class TestCLI():
         # wait a bit
         time.sleep(4)
         # get a random package file name from the repo
-        package_list = RHUIManagerCLI.packages_list(RHUA, repo)
-        test_package = random.choice(package_list)
+        package_list = PulpAPI.list_packages(RHUA, repo, fields=["location_href"])
+        test_package = random.choice(package_list).filename
         # construct the full path to the symlink
         # remember the subpath so it can be deleted in the end (to clean up)
         path = f"{RHUI_ROOT}/symlinks/pulp/content/"
@@ -733,14 +737,17 @@ class TestCLI():
     def test_54_orphan_cleanup():
         '''check if rhui-manager can have orphans removed'''
         # first, check if there are any artifacts
-        artifacts = Helpers.get_artifacts(RHUA)
-        nose.tools.ok_(artifacts)
+        artifacts_before = Artifacts.snapshot(RHUA)
+        nose.tools.ok_(artifacts_before)
         # have them removed
         RHUIManagerCLI.repo_orphan_cleanup(RHUA)
         time.sleep(10)
-        # check if there are none
-        artifacts = Helpers.get_artifacts(RHUA)
-        nose.tools.ok_(not artifacts)
+        # check if there are none, and none have appeared
+        artifacts_after = Artifacts.snapshot(RHUA)
+        nose.tools.ok_(not artifacts_after,
+                       msg=f"{len(artifacts_after & artifacts_before)} artifacts kept, " +
+                       f"{len(artifacts_after - artifacts_before)} new, " +
+                       f"e.g. {sorted(artifacts_after)[:3]}")
 
     @staticmethod
     def test_99_cleanup():
@@ -7,6 +7,7 @@ from stitches.expect import Expect
 
 from rhui4_tests_lib.conmgr import ConMgr
 
+# __depends: rhua
 RHUA = ConMgr.connect()
 
 def _check_rhui_rpms(connection, query, present=True):
@@ -1,10 +1,11 @@
 """Comps XML (Yum Package Groups) Tests"""
 
-# To skip the registration of CDS and HAProxy nodes --
-# because you want to save time in each client test case and do this beforehand -- run:
-# export RHUISKIPSETUP=1
-# in your shell before running this script.
-# The cleanup will be skipped, too, so you ought to clean up eventually.
+# The setup steps (logging in, uploading an entitlement certificate, registering CDS and HAProxy
+# nodes) are only performed if they have not been done yet, e.g. by rhuitestsetup.
+# To keep the certificate and the nodes for other test cases, run:
+# export RHUIDEFERCLEANUP=1
+# in your shell before running this script. (RHUISKIPSETUP=1 has the same effect.)
+# The cleanup will be skipped, so you ought to clean up eventually, e.g. by rhuitestcleanup.
 
 from os import getenv
 from os.path import basename
@@ -16,14 +17,16 @@ from stitches.expect import Expect, ExpectFailed
 import yaml
 
 from rhui4_tests_lib.conmgr import ConMgr
-from rhui4_tests_lib.rhuimanager import RHUIManager
 from rhui4_tests_lib.rhuimanager_cmdline import RHUIManagerCLI
 from rhui4_tests_lib.rhuimanager_cmdline_instance import RHUIManagerCLIInstance
+from rhui4_tests_lib.rhuisetup import RHUISetup
 from rhui4_tests_lib.util import Util
 from rhui4_tests_lib.yummy import Yummy
 
 logging.basicConfig(level=logging.DEBUG)
 
+# __fixtures: cds haproxy
+# __depends: rhua cds haproxy cli
 RHUA = ConMgr.connect()
 # __reusable_clients_with_cds
 # To make this script communicate with a client machine different from cli01.example.com, run:
@@ -57,10 +60,7 @@ class TestCompsXML():
     @staticmethod
     def test_01_setup():
         """log in to RHUI, ensure CDS & HAProxy nodes have been added"""
-        if not getenv("RHUISKIPSETUP"):
-            RHUIManager.initial_run(RHUA)
-            RHUIManagerCLIInstance.add(RHUA, "cds", unsafe=True)
-            RHUIManagerCLIInstance.add(RHUA, "haproxy", unsafe=True)
+        RHUISetup.ensure(RHUA, cert="")
         # check that
         cds_list = RHUIManagerCLIInstance.list(RHUA, "cds")
         nose.tools.ok_(cds_list)
@@ -120,8 +120,9 @@ class TestCompsXML():
 
     def test_09_check_groups(self):
         """compare client's available groups with the 2nd original comps file, check a test group"""
-        Expect.expect_retval(CLI, "yum clean all")
-        groups_on_client = Yummy.grouplist(CLI)
+        revisions = {f"rhui-custom-{self.test_repos[1]}":
+                     Yummy.rhua_repo_revision(RHUA, self.test_repos[1])}
+        groups_on_client = Yummy.grouplist(CLI, revisions)
         original_comps_xml = f"{TEST_DIR}/{self.test_repos[1]}/comps.xml"
         groups_in_xml = Yummy.comps_xml_grouplist(RHUA, original_comps_xml)
         nose.tools.eq_(groups_on_client, groups_in_xml)
@@ -155,10 +156,10 @@ class TestCompsXML():
         repo = self.test_repos[1]
         modified_comps_xml = f"{TEST_DIR}/{repo}/mod-comps.xml"
         RHUIManagerCLI.repo_add_comps(RHUA, repo, modified_comps_xml)
-        Expect.expect_retval(CLI, "yum clean all")
         # compare client's available groups with the *original* comps file,
         # expecting all the original groups plus the extra group
-        groups_on_client = Yummy.grouplist(CLI)
+        revisions = {f"rhui-custom-{repo}": Yummy.rhua_repo_revision(RHUA, repo)}
+        groups_on_client = Yummy.grouplist(CLI, revisions)
         original_comps_xml = f"{TEST_DIR}/{repo}/comps.xml"
         groups_in_xml = Yummy.comps_xml_grouplist(RHUA, original_comps_xml)
         # trick: put the extra group to the right place in the sorted list
@@ -245,10 +246,7 @@ class TestCompsXML():
         RHUIManagerCLI.repo_delete(RHUA, self.other_repos["big"])
         RHUIManagerCLI.repo_delete(RHUA, self.other_repos["zip"])
         # uninstall HAProxy & CDS, forget their keys
-        if not getenv("RHUISKIPSETUP"):
-            RHUIManagerCLIInstance.delete(RHUA, "haproxy", force=True)
-            RHUIManagerCLIInstance.delete(RHUA, "cds", force=True)
-            ConMgr.remove_ssh_keys(RHUA)
+        RHUISetup.cleanup(RHUA, certs=False)
         # if running RHEL Beta, destroy the non-Beta repos again
         cmd = "if grep -c Beta /etc/redhat-release; then " \
               "rm -f /etc/yum.repos.d/redhat-rhui.repo; fi"
@@ -17,6 +17,7 @@ logging.basicConfig(level=logging.DEBUG)
 
 CDS_HOSTNAMES = ConMgr.get_cds_hostnames()
 
+# __depends: rhua cds
 RHUA = ConMgr.connect()
 CDS = [ConMgr.connect(host) for host in CDS_HOSTNAMES]
 
@@ -30,6 +30,7 @@ from rhui4_tests_lib.rhuimanager_cmdline_instance import RHUIManagerCLIInstance
 
 logging.basicConfig(level=logging.DEBUG)
 
+# __depends: rhua cds haproxy
 RHUA = ConMgr.connect()
 CDS_HOSTNAME = ConMgr.get_cds_hostnames()[0]
 CDS = ConMgr.connect(CDS_HOSTNAME)
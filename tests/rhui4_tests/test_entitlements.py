@@ -17,6 +17,7 @@ from rhui4_tests_lib.util import Util
 
 logging.basicConfig(level=logging.DEBUG)
 
+# __depends: rhua
 RHUA = ConMgr.connect()
 
 class TestEntitlement():
@@ -1,10 +1,11 @@
 '''EUS Tests (for the CLI)'''
 
-# To skip the upload of an entitlement certificate and the registration of CDS and HAProxy nodes --
-# because you want to save time in each client test case and do this beforehand -- run:
-# export RHUISKIPSETUP=1
-# in your shell before running this script.
-# The cleanup will be skipped, too, so you ought to clean up eventually.
+# The setup steps (logging in, uploading an entitlement certificate, registering CDS and HAProxy
+# nodes) are only performed if they have not been done yet, e.g. by rhuitestsetup.
+# To keep the certificate and the nodes for other test cases, run:
+# export RHUIDEFERCLEANUP=1
+# in your shell before running this script. (RHUISKIPSETUP=1 has the same effect.)
+# The cleanup will be skipped, so you ought to clean up eventually, e.g. by rhuitestcleanup.
 
 from os import getenv
 from os.path import basename
@@ -17,13 +18,15 @@ import yaml
 
 from rhui4_tests_lib.conmgr import ConMgr
 from rhui4_tests_lib.rhuimanager_cmdline_instance import RHUIManagerCLIInstance
-from rhui4_tests_lib.rhuimanager import RHUIManager
+from rhui4_tests_lib.rhuisetup import RHUISetup
 from rhui4_tests_lib.rhuimanager_cmdline import RHUIManagerCLI
 from rhui4_tests_lib.util import Util
 from rhui4_tests_lib.yummy import Yummy
 
 logging.basicConfig(level=logging.DEBUG)
 
+# __fixtures: cert cds haproxy
+# __depends: rhua cds haproxy cli
 RHUA = ConMgr.connect()
 # __reusable_clients_with_cds
 # To make this script communicate with a client machine different from cli01.example.com, run:
@@ -65,16 +68,14 @@ class TestEUSCLI():
         '''
         log in to RHUI
         '''
-        if not getenv("RHUISKIPSETUP"):
-            RHUIManager.initial_run(RHUA)
+        RHUISetup.ensure(RHUA, cert="", cds_hostnames=[], haproxy=False)
 
     @staticmethod
     def test_02_add_cds():
         '''
         add a CDS
         '''
-        if not getenv("RHUISKIPSETUP"):
-            RHUIManagerCLIInstance.add(RHUA, "cds", unsafe=True)
+        RHUISetup.ensure(RHUA, cert="", haproxy=False)
         # check that
         cds_list = RHUIManagerCLIInstance.list(RHUA, "cds")
         nose.tools.ok_(cds_list)
@@ -84,8 +85,7 @@ class TestEUSCLI():
         '''
         add an HAProxy Load-Balancer
         '''
-        if not getenv("RHUISKIPSETUP"):
-            RHUIManagerCLIInstance.add(RHUA, "haproxy", unsafe=True)
+        RHUISetup.ensure(RHUA, cert="", cds_hostnames=[])
         # check that
         hap_list = RHUIManagerCLIInstance.list(RHUA, "haproxy")
         nose.tools.ok_(hap_list)
@@ -95,8 +95,7 @@ class TestEUSCLI():
         '''
         upload an entitlement certificate
         '''
-        if not getenv("RHUISKIPSETUP"):
-            RHUIManagerCLI.cert_upload(RHUA)
+        RHUISetup.ensure(RHUA, cds_hostnames=[], haproxy=False)
 
     def test_05_add_repo(self):
         '''
@@ -160,11 +159,7 @@ class TestEUSCLI():
         Expect.expect_retval(CLI, f"rm -rf {TMPDIR}")
         RHUIManagerCLI.repo_delete(RHUA, self.repo_id)
         Expect.expect_retval(RHUA, f"rm -rf /tmp/{CONF_RPM_NAME}*")
-        if not getenv("RHUISKIPSETUP"):
-            RHUIManager.remove_rh_certs(RHUA)
-            RHUIManagerCLIInstance.delete(RHUA, "haproxy", force=True)
-            RHUIManagerCLIInstance.delete(RHUA, "cds", force=True)
-            ConMgr.remove_ssh_keys(RHUA)
+        RHUISetup.cleanup(RHUA)
 
     @staticmethod
     def teardown_class():
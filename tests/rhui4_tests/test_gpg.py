@@ -16,6 +16,7 @@ from stitches.expect import Expect
 from rhui4_tests_lib.conmgr import ConMgr
 from rhui4_tests_lib.rhuimanager import RHUIManager
 from rhui4_tests_lib.rhuimanager_client import RHUIManagerClient
+from rhui4_tests_lib.rhuimanager_cmdline import RHUIManagerCLI
 from rhui4_tests_lib.rhuimanager_instance import RHUIManagerInstance
 from rhui4_tests_lib.rhuimanager_repo import RHUIManagerRepo
 from rhui4_tests_lib.util import Util
@@ -23,8 +24,11 @@ from rhui4_tests_lib.yummy import Yummy
 
 logging.basicConfig(level=logging.DEBUG)
 
+# __fixtures: cds haproxy
+# __depends: rhua cds haproxy cli
 RHUA = ConMgr.connect()
 # __reusable_clients_with_cds
+# __exclusive
 # To make this script communicate with a client machine different from cli01.example.com, run:
 # export RHUICLI=hostname
 # in your shell before running this script, replacing "hostname" with the actual client host name.
@@ -170,7 +174,7 @@ def test_99_cleanup():
     else:
         cache = f"/var/cache/dnf/rhui-custom-{REPO}*/"
     Expect.expect_retval(CLI, "rm -rf " + cache)
-    RHUIManagerRepo.delete_all_repos(RHUA)
+    RHUIManagerCLI.repo_delete(RHUA, REPO)
     Expect.expect_retval(RHUA, f"rm -rf /tmp/{REPO}*")
     if not getenv("RHUISKIPSETUP"):
         RHUIManagerInstance.delete_all(RHUA, "loadbalancers")
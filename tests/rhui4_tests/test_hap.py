@@ -17,6 +17,7 @@ logging.basicConfig(level=logging.DEBUG)
 
 HA_HOSTNAME = ConMgr.get_lb_hostname()
 
+# __depends: rhua haproxy
 RHUA = ConMgr.connect()
 HAPROXY = ConMgr.connect(HA_HOSTNAME)
 
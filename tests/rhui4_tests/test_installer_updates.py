@@ -17,6 +17,7 @@ ARG_IGNORE_UPDATES = "--ignore-newer-rhel-packages"
 
 CUSTOM_CONFIG = {"section": "rhui", "option": "log_level", "value": "DEBUG"}
 
+# __depends: rhua
 RHUA = ConMgr.connect()
 
 def setup():
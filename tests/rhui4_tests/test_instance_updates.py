@@ -17,6 +17,7 @@ TEST_PACKAGE = "tzdata"
 CDS_HOSTNAME = ConMgr.get_cds_hostnames()[0]
 HA_HOSTNAME = ConMgr.get_lb_hostname()
 
+# __depends: rhua cds haproxy
 RHUA = ConMgr.connect()
 CDS = ConMgr.connect(CDS_HOSTNAME)
 HAPROXY = ConMgr.connect(HA_HOSTNAME)
@@ -28,8 +29,8 @@ def setup():
 def test_01_downgrade_test_package():
     """log in to RHUI, downgrade the test package on the CDS and HAProxy instaces"""
     RHUIManager.initial_run(RHUA)
-    for node in CDS, HAPROXY:
-        Yummy.downgrade(node, [TEST_PACKAGE])
+    failures = Yummy.batch_failures(Yummy.batch_downgrade([CDS, HAPROXY], [TEST_PACKAGE]))
+    nose.tools.ok_(not failures, msg=f"downgrade failed: {failures}")
 
 def test_02_add_cds_no_update():
     """add a CDS and make it ignore RHEL updates"""
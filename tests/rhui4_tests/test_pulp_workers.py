@@ -13,6 +13,7 @@ logging.basicConfig(level=logging.DEBUG)
 
 RHUA_HOSTNAME = ConMgr.get_rhua_hostname()
 
+# __depends: rhua
 RHUA = ConMgr.connect()
 
 CUSTOM_WORKER_COUNT = 2
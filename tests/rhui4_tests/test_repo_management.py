@@ -24,6 +24,7 @@ from rhui4_tests_lib.util import Util
 
 logging.basicConfig(level=logging.DEBUG)
 
+# __depends: rhua
 RHUA = ConMgr.connect()
 # side channel for hacking
 RHUA_2 = ConMgr.connect()
@@ -196,25 +197,32 @@ class TestRepo():
     def test_13_remove_package():
         '''check if packages can be removed from a custom repo'''
         before_list = RHUIManagerRepo.check_for_package(RHUA, CUSTOM_REPOS[0])
+        # the release can contain dots, so take it from Pulp rather than from the file name
+        removed_package = [package for package in PulpAPI.list_packages(RHUA, CUSTOM_REPOS[0])
+                           if package.filename == before_list[0]][0]
         RHUIManagerRepo.remove_packages(RHUA, CUSTOM_REPOS[0], [before_list[0]])
         time.sleep(5)
-        after_list = RHUIManagerRepo.check_for_package(RHUA, CUSTOM_REPOS[0])
-        nose.tools.eq_(after_list, before_list[1:])
+        nose.tools.ok_(not PulpAPI.has_package(RHUA,
+                                               CUSTOM_REPOS[0],
+                                               removed_package.name,
+                                               removed_package.version,
+                                               removed_package.release),
+                       msg=f"{before_list[0]} is still in {CUSTOM_REPOS[0]}")
+        after_list = [package.filename for package in PulpAPI.list_packages(RHUA, CUSTOM_REPOS[0])]
+        nose.tools.eq_(sorted(after_list), before_list[1:])
 
         # also selectively remove everything from another repo
         before_list = RHUIManagerRepo.check_for_package(RHUA, CUSTOM_REPOS[1])
         RHUIManagerRepo.remove_packages(RHUA, CUSTOM_REPOS[1], before_list)
         time.sleep(5)
-        after_list = RHUIManagerRepo.check_for_package(RHUA, CUSTOM_REPOS[1])
-        nose.tools.eq_(after_list, [])
+        nose.tools.eq_(PulpAPI.list_packages(RHUA, CUSTOM_REPOS[1]), [])
 
     @staticmethod
     def test_14_remove_all_packages():
         '''check if all packages can be removed from a custom repo'''
         RHUIManagerRepo.remove_all_packages(RHUA, CUSTOM_REPOS[2])
         time.sleep(5)
-        after_list = RHUIManagerRepo.check_for_package(RHUA, CUSTOM_REPOS[2])
-        nose.tools.eq_(after_list, [])
+        nose.tools.eq_(PulpAPI.list_packages(RHUA, CUSTOM_REPOS[2]), [])
 
     def test_15_add_rh_repo_by_product(self):
         '''add a Red Hat repo by the product that contains it, remove it'''
@@ -1,10 +1,11 @@
 """Tests for Repository Prefix Customization"""
 
-# To skip the registration of CDS and HAProxy nodes --
-# because you want to save time in each client test case and do this beforehand -- run:
-# export RHUISKIPSETUP=1
-# in your shell before running this script.
-# The cleanup will be skipped, too, so you ought to clean up eventually.
+# The setup steps (logging in, uploading an entitlement certificate, registering CDS and HAProxy
+# nodes) are only performed if they have not been done yet, e.g. by rhuitestsetup.
+# To keep the certificate and the nodes for other test cases, run:
+# export RHUIDEFERCLEANUP=1
+# in your shell before running this script. (RHUISKIPSETUP=1 has the same effect.)
+# The cleanup will be skipped, so you ought to clean up eventually, e.g. by rhuitestcleanup.
 
 from os import getenv
 from os.path import basename
@@ -16,16 +17,19 @@ import yaml
 
 from rhui4_tests_lib.cfg import Config, ANSWERS
 from rhui4_tests_lib.conmgr import ConMgr
-from rhui4_tests_lib.rhuimanager import RHUIManager
 from rhui4_tests_lib.rhuimanager_cmdline import RHUIManagerCLI
 from rhui4_tests_lib.rhuimanager_cmdline_instance import RHUIManagerCLIInstance
+from rhui4_tests_lib.rhuisetup import RHUISetup
 from rhui4_tests_lib.util import Util
 from rhui4_tests_lib.yummy import Yummy
 
 logging.basicConfig(level=logging.DEBUG)
 
+# __fixtures: cert cds haproxy
+# __depends: rhua cds haproxy cli
 RHUA = ConMgr.connect()
 # __reusable_clients_with_cds
+# __exclusive
 # To make this script communicate with a client machine different from cli01.example.com, run:
 # export RHUICLI=hostname
 # in your shell before running this script, replacing "hostname" with the actual client host name.
@@ -56,10 +60,7 @@ class TestRepoPrefix():
     @staticmethod
     def test_01_setup():
         """log in to RHUI, ensure CDS & HAProxy nodes have been added"""
-        if not getenv("RHUISKIPSETUP"):
-            RHUIManager.initial_run(RHUA)
-            RHUIManagerCLIInstance.add(RHUA, "cds", unsafe=True)
-            RHUIManagerCLIInstance.add(RHUA, "haproxy", unsafe=True)
+        RHUISetup.ensure(RHUA, cert="")
         # check that
         cds_list = RHUIManagerCLIInstance.list(RHUA, "cds")
         nose.tools.ok_(cds_list)
@@ -68,8 +69,7 @@ class TestRepoPrefix():
 
     def test_02_add_repos(self):
         """add and sync a Red Hat repo, and create protected and uprotected custom repos"""
-        if not getenv("RHUISKIPSETUP"):
-            RHUIManagerCLI.cert_upload(RHUA)
+        RHUISetup.ensure(RHUA, cds_hostnames=[], haproxy=False)
         RHUIManagerCLI.repo_add_by_repo(RHUA, [self.rh_repo_id], True)
         RHUIManagerCLI.repo_create_custom(RHUA, self.prot_custom_repo_id, protected=True)
         RHUIManagerCLI.repo_create_custom(RHUA, self.unprot_custom_repo_id)
@@ -204,11 +204,7 @@ class TestRepoPrefix():
         # restore the RHUI configuration file (with the default prefix)
         Config.restore_rhui_tools_conf(RHUA)
         # uninstall HAProxy & CDS, forget their keys
-        if not getenv("RHUISKIPSETUP"):
-            RHUIManager.remove_rh_certs(RHUA)
-            RHUIManagerCLIInstance.delete(RHUA, "haproxy", force=True)
-            RHUIManagerCLIInstance.delete(RHUA, "cds", force=True)
-            ConMgr.remove_ssh_keys(RHUA)
+        RHUISetup.cleanup(RHUA)
 
     @staticmethod
     def teardown_class():
@@ -16,6 +16,7 @@ from rhui4_tests_lib.rhuimanager_cmdline import RHUIManagerCLI
 
 logging.basicConfig(level=logging.DEBUG)
 
+# __depends: rhua
 RHUA = ConMgr.connect()
 
 class TestCLI():
@@ -13,6 +13,7 @@ from rhui4_tests_lib.conmgr import ConMgr
 
 logging.basicConfig(level=logging.DEBUG)
 
+# __depends: rhua
 RHUA = ConMgr.connect()
 
 DOC = "https://access.redhat.com/documentation/en-us/red_hat_update_infrastructure/4/html/" \
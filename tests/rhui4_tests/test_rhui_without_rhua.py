@@ -28,6 +28,7 @@ from rhui4_tests_lib.yummy import Yummy
 logging.basicConfig(level=logging.DEBUG)
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# __depends: rhua cds cli
 RHUA = ConMgr.connect()
 # To make this script communicate with a client machine different from cli01.example.com, run:
 # export RHUICLI=hostname
@@ -27,6 +27,7 @@ PROTOCOLS = {"good": ["tls1_2", "tls1_3"],
              "bad": ["tls1", "tls1_1"]}
 
 # connections to the RHUA and the HAProxy nodes
+# __depends: rhua cds haproxy
 RHUA = ConMgr.connect()
 CDS = ConMgr.connect(HOSTNAMES["CDS"])
 HAPROXY = ConMgr.connect(HOSTNAMES["HAProxy"])
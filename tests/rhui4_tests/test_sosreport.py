@@ -22,6 +22,7 @@ TMPDIR = mkdtemp()
 SOSREPORT_LOCATION_RHUA = join(TMPDIR, "sosreport_location_rhua")
 SOSREPORT_LOCATION_CDS = join(TMPDIR, "sosreport_location_cds")
 
+# __depends: rhua cds
 CONNECTION_RHUA = RHUA = ConMgr.connect()
 CONNECTION_CDS = ConMgr.connect(ConMgr.get_cds_hostnames()[0])
 
@@ -37,6 +38,13 @@ WANTED_FILES_CDS = ["/etc/nginx/nginx.conf",
                     "/var/log/nginx/access.log",
                     "/var/log/nginx/error.log"]
 
+# files with confidential information, and the options whose values must be hidden
+CONFIDENTIAL_RHUA = {"/root/.rhui/http-localhost:24817/cookies.txt": ["csrftoken", "sessionid"],
+                     RHUI_CFG: ["registry_password"]}
+
+# indexes of the archives, so that each archive is only read once
+INDEXES = {}
+
 CMDS_RHUA = ["rhui-manager status",
              "rhui-manager cert info"]
 CMDS_CDS = [f"ls -alZR {RHUI_ROOT}"]
@@ -75,7 +83,8 @@ def test_02_rhua_sosreport_check():
     '''
     with open(SOSREPORT_LOCATION_RHUA, encoding="utf-8") as location:
         sosreport_location = location.read()
-    Sos.check_files_in_archive(CONNECTION_RHUA, WANTED_FILES_RHUA, sosreport_location)
+    INDEXES["rhua"] = Sos.index(CONNECTION_RHUA, sosreport_location, list(CONFIDENTIAL_RHUA))
+    Sos.check_files_in_index(INDEXES["rhua"], WANTED_FILES_RHUA)
 
 def test_03_cds_sosreport_run():
     '''
@@ -97,19 +106,14 @@ def test_05_check_confidential_data():
     '''
         check if known confidential information is obfuscated in the archive
     '''
-    with open(SOSREPORT_LOCATION_RHUA, encoding="utf-8") as location:
-        sosreport_location = location.read()
-    # cookies
-    for cookie in ["csrftoken", "sessionid"]:
-        Sos.is_obfuscated(CONNECTION_RHUA,
-                          cookie,
-                          "/root/.rhui/http-localhost:24817/cookies.txt",
-                          sosreport_location)
-    # registry password
-    Sos.is_obfuscated(CONNECTION_RHUA,
-                      "registry_password",
-                      "/etc/rhui/rhui-tools.conf",
-                      sosreport_location)
+    if "rhua" not in INDEXES:
+        with open(SOSREPORT_LOCATION_RHUA, encoding="utf-8") as location:
+            sosreport_location = location.read()
+        INDEXES["rhua"] = Sos.index(CONNECTION_RHUA, sosreport_location, list(CONFIDENTIAL_RHUA))
+    # cookies, registry password
+    for path, options in CONFIDENTIAL_RHUA.items():
+        for option in options:
+            Sos.is_obfuscated_in_index(INDEXES["rhua"], option, path)
 
 def test_99_cleanup():
     '''
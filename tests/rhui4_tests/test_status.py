@@ -31,6 +31,8 @@ CERT_WARN = 32
 CERT_ERROR = 64
 SERVICE_ERROR = 128
 
+# __fixtures: cert cds haproxy
+# __depends: rhua cds haproxy
 RHUA = ConMgr.connect()
 HA_HOSTNAME = ConMgr.get_lb_hostname()
 HAPROXY = ConMgr.connect(HA_HOSTNAME)
@@ -14,6 +14,7 @@ from rhui4_tests_lib.subscription import RHSMRHUI
 
 logging.basicConfig(level=logging.DEBUG)
 
+# __depends: rhua
 RHUA = ConMgr.connect()
 
 class TestSubscription():
@@ -4,17 +4,19 @@
 # export RHUICONTCDS=1
 # in your shell before running this script.
 
-from os import getenv
-from os.path import basename
+from os import getenv, remove
+from os.path import basename, exists
 
 import logging
 import nose
 from stitches.expect import Expect
 
+from rhui4_tests_lib.artifacts import Artifacts
 from rhui4_tests_lib.cfg import Config, ANSWERS_BAK, RHUI_ROOT
 from rhui4_tests_lib.conmgr import ConMgr
 from rhui4_tests_lib.incontainers import RhuiinContainers
 from rhui4_tests_lib.rhuimanager import RHUIManager
+from rhui4_tests_lib.rhuimanager_cmdline import RHUIManagerCLI
 from rhui4_tests_lib.rhuimanager_cmdline_instance import RHUIManagerCLIInstance
 
 logging.basicConfig(level=logging.DEBUG)
@@ -22,6 +24,7 @@ logging.basicConfig(level=logging.DEBUG)
 RHUA_HOSTNAME = ConMgr.get_rhua_hostname()
 CDS_HOSTNAME = ConMgr.get_cds_hostnames()[0]
 
+# __depends: rhua cds
 RHUA = ConMgr.connect()
 CDS = ConMgr.connect(CDS_HOSTNAME)
 
@@ -30,6 +33,14 @@ FORCE_FLAG = " --remote-fs-force-change"
 
 USE_CONTAINER = getenv("RHUICONTCDS") is not None
 
+# a separate index of the artifacts, so that the verification here always checks them all
+ARTIFACT_INDEX = "/tmp/rhui_switch_storage_artifacts.db"
+
+# a package to store on the new share so that there is something to verify there
+CUSTOM_REPO = "switch_storage_repo"
+DATADIR = "/tmp/extra_rhui_files"
+TEST_RPM = "rhui-rpm-upload-test-1-1.noarch.rpm"
+
 def _check_rhui_mountpoint(connection, fs_server, options="", container=False):
     """check the RHUI mountpoint"""
     cat = RhuiinContainers.exec_cmd("cds", "cat") if container else "cat"
@@ -122,8 +133,22 @@ def test_10_check_cds_mountpoint():
     """check if the new options are now used on the CDS"""
     _check_rhui_mountpoint(CDS, RHUA_HOSTNAME, NEW_FS_OPTIONS, USE_CONTAINER)
 
+def test_11_upload_package():
+    """store a package on the new share"""
+    RHUIManagerCLI.repo_create_custom(RHUA, CUSTOM_REPO)
+    RHUIManagerCLI.packages_upload(RHUA, CUSTOM_REPO, f"{DATADIR}/{TEST_RPM}")
+
+def test_12_verify_artifacts():
+    """check if the artifacts on the remounted share match their checksums"""
+    result = Artifacts.verify(RHUA, restart=True, index_file=ARTIFACT_INDEX)
+    nose.tools.ok_(result.checked > 0, msg="no artifacts were found on the new share")
+    nose.tools.ok_(not result.bad, msg=f"bad artifacts: {result.bad}")
+
 def test_99_cleanup():
-    """clean up: delete the CDS and rerun the installer with the original remote FS"""
+    """clean up: delete the repo and the CDS and rerun the installer with the original remote FS"""
+    # the package must be removed while the share it is stored on is still in use
+    RHUIManagerCLI.repo_delete(RHUA, CUSTOM_REPO)
+    RHUIManagerCLI.repo_orphan_cleanup(RHUA)
     RHUIManagerCLIInstance.delete(RHUA, "cds", [CDS_HOSTNAME], force=True)
     # get the original FS server hostname from the backed up answers file
     original_fs_server = Config.get_from_answers(RHUA, "remote_fs_server", ANSWERS_BAK)
@@ -139,6 +164,8 @@ def test_99_cleanup():
     # finish the cleanup
     Config.restore_answers(RHUA)
     ConMgr.remove_ssh_keys(RHUA)
+    if exists(ARTIFACT_INDEX):
+        remove(ARTIFACT_INDEX)
 
 def teardown():
     """announce the end of the test run"""
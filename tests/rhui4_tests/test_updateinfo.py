@@ -15,6 +15,7 @@ from stitches.expect import Expect
 import yaml
 
 from rhui4_tests_lib.conmgr import ConMgr
+from rhui4_tests_lib.repodata import Repodata
 from rhui4_tests_lib.rhuimanager import RHUIManager
 from rhui4_tests_lib.rhuimanager_client import RHUIManagerClient
 from rhui4_tests_lib.rhuimanager_cmdline import RHUIManagerCLI
@@ -25,8 +26,11 @@ from rhui4_tests_lib.yummy import Yummy
 
 logging.basicConfig(level=logging.DEBUG)
 
+# __fixtures: cds haproxy
+# __depends: rhua cds haproxy cli
 RHUA = ConMgr.connect()
 # __reusable_clients_with_cds
+# __exclusive
 # To make this script communicate with a client machine different from cli01.example.com, run:
 # export RHUICLI=hostname
 # in your shell before running this script, replacing "hostname" with the actual client host name.
@@ -176,23 +180,24 @@ class TestClient():
         '''
            check if the all the updates from the original updateinfo file are available from RHUI
         '''
-        errata_pattern = "RH.A-[0-9]*:[0-9]*"
         if self.version <= 7:
             cache = f"/var/cache/yum/{self.arch}/{self.version}Server/" + \
                     f"rhui-custom-{self.test['repo_id']}"
         else:
             cache = f"/var/cache/dnf/rhui-custom-{self.test['repo_id']}*/repodata"
 
-        _, stdout, _ = RHUA.exec_command(f"zgrep -o '{errata_pattern}' " +
-                                         f"/tmp/extra_rhui_files/{self.test['repo_id']}" +
-                                         "/updateinfo.xml.gz " +
-                                         "| sort -u")
-        orig_errata = stdout.read().decode().splitlines()
-
-        _, stdout, _ = CLI.exec_command(f"zgrep -o '{errata_pattern}' " +
-                                        f"{cache}/*updateinfo.xml.gz " +
-                                        "| sort -u")
-        processed_errata = stdout.read().decode().splitlines()
+        advisories = Repodata.cached(RHUA,
+                                     f"/tmp/extra_rhui_files/{self.test['repo_id']}" +
+                                     "/updateinfo.xml.gz",
+                                     Repodata.advisories)
+        orig_errata = sorted({advisory.id for advisory in advisories})
+
+        # parse the client's copy the same way, rather than grep for IDs with a known format
+        _, stdout, _ = CLI.exec_command(f"ls {cache}/*updateinfo.xml.gz")
+        cached_files = stdout.read().decode().split()
+        nose.tools.ok_(cached_files, msg=f"no updateinfo in {cache}")
+        processed_errata = sorted({advisory.id for cached_file in cached_files
+                                   for advisory in Repodata.advisories(CLI, cached_file)})
         nose.tools.eq_(orig_errata, processed_errata)
 
     def test_13_uncompressed_xml(self):
@@ -212,7 +217,7 @@ class TestClient():
            remove the repo, uninstall hap, cds, cli rpm artefacts; remove rpms from cli
         '''
         Util.remove_rpm(CLI, [self.test["test_package"], self.test["repo_id"]])
-        RHUIManagerRepo.delete_all_repos(RHUA)
+        RHUIManagerCLI.repo_delete(RHUA, self.test["repo_id"])
         Expect.expect_retval(RHUA, f"rm -rf /tmp/{self.test['repo_id']}*")
         # delete the errata from Pulp
         RHUIManagerCLI.repo_orphan_cleanup(RHUA)
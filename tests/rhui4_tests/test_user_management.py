@@ -19,6 +19,7 @@ logging.basicConfig(level=logging.DEBUG)
 CREDS_BACKUP = "/root/rhui-subscription-sync.conf"
 TEST_COMMAND = "cert info"
 TEST_PASSWORD = "--aw!100%safe $ex, drums&rock'n'roll"
+# __depends: rhua
 RHUA = ConMgr.connect()
 
 def setup():
@@ -8,6 +8,7 @@ from rhui4_tests_lib.cfg import Config
 from rhui4_tests_lib.conmgr import ConMgr
 from rhui4_tests_lib.yummy import Yummy
 
+# __depends: rhua cds
 RHUA = ConMgr.connect()
 CDS = ConMgr.connect(ConMgr.get_cds_hostnames()[0])
 
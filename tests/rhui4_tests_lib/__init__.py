@@ -1,8 +1,14 @@
 """ RHUI 4 Testing Library """
 
 import logging
+import os
 import sys
 
 if __name__ == "__main__":
     logging.error("I'm just a library.")
     sys.exit(1)
+
+# to record the durations of remote operations and waits, set RHUITIMING to the path to a file
+if os.getenv("RHUITIMING"):
+    from rhui4_tests_lib.timing import Timing
+    Timing.enable(os.getenv("RHUITIMING"))
@@ -0,0 +1,189 @@
+"""Streaming Listing and Local Index of Pulp Artifacts"""
+
+from collections import namedtuple
+from contextlib import closing
+import os
+from os.path import dirname
+import re
+import shlex
+import sqlite3
+import time
+import zlib
+
+from rhui4_tests_lib.cfg import RHUI_ROOT
+
+ARTIFACT_DIR = f"{RHUI_ROOT}/pulp3/artifact"
+INDEX_FILE = "/var/cache/rhui4_tests/artifacts.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, mtime REAL);
+CREATE TABLE IF NOT EXISTS artifacts (path TEXT PRIMARY KEY, dir TEXT, size INTEGER, mtime REAL);
+CREATE INDEX IF NOT EXISTS artifacts_dir ON artifacts (dir);
+CREATE TABLE IF NOT EXISTS verified (path TEXT PRIMARY KEY, status TEXT, digest TEXT, checked REAL);
+"""
+
+# how many directories to list in one command
+DIR_BATCH = 256
+
+# how many artifacts to hash in one command; the progress is saved after each batch
+HASH_BATCH = 500
+
+# Pulp stores artifacts as ab/cdef..., where abcdef... is the SHA-256 checksum
+CHECKSUM_PATH = re.compile(r"^([0-9a-f]{2})/([0-9a-f]{62})$")
+
+# the path relative to the artifact directory, the size in bytes, and the modification time
+Artifact = namedtuple("Artifact", ["path", "size", "mtime"])
+
+# the number of artifacts checked in a verification run, and {path: status} of the bad ones
+Verification = namedtuple("Verification", ["checked", "bad"])
+
+def _lines(connection, command):
+    """run the command and yield the lines of its output one by one"""
+    _, stdout, _ = connection.exec_command(command)
+    for line in iter(stdout.readline, b""):
+        yield line.decode().rstrip("\n")
+
+def _relative(path):
+    """return the path without the ./ prefix that find prints with ."""
+    return path[2:] if path.startswith("./") else "" if path == "." else path
+
+def _list_files(connection, dirs, basedir):
+    """yield the Artifacts directly in the given directories, relative to the base directory"""
+    for start in range(0, len(dirs), DIR_BATCH):
+        batch = " ".join(shlex.quote(f"./{path}" if path else ".")
+                         for path in dirs[start:start + DIR_BATCH])
+        for line in _lines(connection,
+                           f"cd {basedir} && find {batch} -maxdepth 1 -type f " +
+                           "-printf '%p\\t%s\\t%T@\\n'"):
+            path, size, mtime = line.split("\t")
+            yield Artifact(_relative(path), int(size), float(mtime))
+
+def _in_sample(path, sample, seed):
+    """return True if the artifact belongs to the sample; the same artifacts are always chosen"""
+    return sample >= 1 or zlib.crc32(f"{seed}:{path}".encode()) / 2 ** 32 < sample
+
+def _hash(connection, paths, basedir, workers):
+    """return {path: SHA-256 checksum} of the artifacts, hashed by several processes on the node"""
+    # the artifacts are hashed at the lowest CPU and I/O priority so that RHUI is not slowed down
+    stdin, stdout, _ = connection.exec_command(f"cd {basedir} && " +
+                                               "ionice -c 3 nice -n 19 " +
+                                               f"xargs -0 -P {workers} -n 16 sha256sum")
+    stdin.write("\0".join(paths))
+    stdin.channel.shutdown_write()
+    digests = {}
+    for line in iter(stdout.readline, b""):
+        digest, path = line.decode().rstrip("\n").split("  ", 1)
+        digests[path] = digest
+    return digests
+
+class Artifacts():
+    """list artifacts without holding them all in memory, and keep an index of them up to date"""
+    @staticmethod
+    def iterate(connection, basedir=ARTIFACT_DIR):
+        """yield an Artifact for each file in the artifact directory as find prints it"""
+        for line in _lines(connection,
+                           f"cd {basedir} && find . -type f -printf '%p\\t%s\\t%T@\\n'"):
+            path, size, mtime = line.split("\t")
+            yield Artifact(_relative(path), int(size), float(mtime))
+
+    @staticmethod
+    def refresh(connection, index_file=INDEX_FILE, basedir=ARTIFACT_DIR):
+        """update the local index with the directories that have changed; return their number"""
+        # adding or removing a file changes the modification time of the directory,
+        # and Pulp never changes artifacts in place, so only such directories are listed again
+        os.makedirs(dirname(index_file), exist_ok=True)
+        with closing(sqlite3.connect(index_file)) as database:
+            database.executescript(SCHEMA)
+            source = f"{connection.hostname}:{basedir}"
+            known_source = database.execute("SELECT value FROM meta WHERE key = 'source'")
+            if (known_source.fetchone() or [source])[0] != source:
+                database.executescript("DELETE FROM dirs; DELETE FROM artifacts;")
+            database.execute("INSERT OR REPLACE INTO meta VALUES ('source', ?)", (source,))
+            known_dirs = dict(database.execute("SELECT path, mtime FROM dirs"))
+            current_dirs = {}
+            for line in _lines(connection,
+                               f"cd {basedir} && find . -type d -printf '%p\\t%T@\\n'"):
+                path, mtime = line.split("\t")
+                current_dirs[_relative(path)] = float(mtime)
+            changed = sorted(path for path, mtime in current_dirs.items()
+                             if known_dirs.get(path) != mtime)
+            gone = [path for path in known_dirs if path not in current_dirs]
+            database.executemany("DELETE FROM artifacts WHERE dir = ?",
+                                 [(path,) for path in changed + gone])
+            database.executemany("DELETE FROM dirs WHERE path = ?", [(path,) for path in gone])
+            database.executemany("INSERT INTO artifacts VALUES (?, ?, ?, ?)",
+                                 ((artifact.path, dirname(artifact.path), artifact.size,
+                                   artifact.mtime)
+                                  for artifact in _list_files(connection, changed, basedir)))
+            database.executemany("INSERT OR REPLACE INTO dirs VALUES (?, ?)",
+                                 [(path, current_dirs[path]) for path in changed])
+            database.commit()
+        return len(changed)
+
+    @staticmethod
+    def indexed(index_file=INDEX_FILE):
+        """return the set of the paths of the artifacts in the local index"""
+        with closing(sqlite3.connect(index_file)) as database:
+            return {row[0] for row in database.execute("SELECT path FROM artifacts")}
+
+    @staticmethod
+    def snapshot(connection, index_file=INDEX_FILE, basedir=ARTIFACT_DIR):
+        """refresh the local index and return the set of the paths of the artifacts in it"""
+        Artifacts.refresh(connection, index_file, basedir)
+        return Artifacts.indexed(index_file)
+
+    @staticmethod
+    def verify(connection, sample=1.0, seed=0, workers=4, restart=False, progress=None,
+               index_file=INDEX_FILE, basedir=ARTIFACT_DIR):
+        """check that the artifacts' checksums match their paths; return a Verification
+
+        the status of a bad artifact is "corrupt", "missing" or "unknown" (not named after
+        a checksum); artifacts checked earlier in the pass are skipped unless restarting,
+        and progress, if given, is called with the numbers of checked and all pending artifacts
+        """
+        Artifacts.refresh(connection, index_file, basedir)
+        bad = {}
+        with closing(sqlite3.connect(index_file)) as database:
+            pass_started = database.execute("SELECT value FROM meta WHERE key = 'pass_started'")
+            pass_started = (pass_started.fetchone() or [None])[0]
+            if restart or pass_started is None:
+                pass_started = time.time()
+                database.execute("INSERT OR REPLACE INTO meta VALUES ('pass_started', ?)",
+                                 (pass_started,))
+                database.commit()
+            # artifacts replaced after they were checked are checked again
+            pending = [path for (path,) in
+                       database.execute("SELECT a.path FROM artifacts a " +
+                                        "LEFT JOIN verified v ON a.path = v.path " +
+                                        "WHERE v.checked IS NULL OR v.checked < ? OR " +
+                                        "v.checked < a.mtime ORDER BY a.path",
+                                        (float(pass_started),))
+                       if _in_sample(path, sample, seed)]
+            for start in range(0, len(pending), HASH_BATCH):
+                paths = pending[start:start + HASH_BATCH]
+                named = [path for path in paths if CHECKSUM_PATH.match(path)]
+                digests = _hash(connection, named, basedir, workers) if named else {}
+                checked = time.time()
+                results = []
+                for path in paths:
+                    if path not in named:
+                        status = "unknown"
+                    elif path not in digests:
+                        status = "missing"
+                    else:
+                        status = "ok" if digests[path] == path.replace("/", "") else "corrupt"
+                    if status != "ok":
+                        bad[path] = status
+                    results.append((path, status, digests.get(path), checked))
+                database.executemany("INSERT OR REPLACE INTO verified VALUES (?, ?, ?, ?)",
+                                     results)
+                database.commit()
+                if progress:
+                    progress(start + len(paths), len(pending))
+            # report the bad artifacts found earlier in this pass, too
+            bad.update(database.execute("SELECT v.path, v.status FROM verified v " +
+                                        "JOIN artifacts a ON a.path = v.path " +
+                                        "WHERE v.status != 'ok' AND v.checked >= ?",
+                                        (float(pass_started),)))
+        return Verification(len(pending), bad)
@@ -0,0 +1,140 @@
+"""Nose Plugin Writing a JSON Lines Stream of Test Events"""
+
+import json
+import os
+import socket
+import time
+
+from nose.plugins import Plugin
+from nose.plugins.skip import SkipTest
+
+from rhui4_tests_lib.timing import Timing
+
+# the file to write the events to if not given on the command line
+EVENTS_FILE = "/tmp/rhuitests_events.jsonl"
+
+def _outcome(err):
+    """return the outcome for the exception info of a failed or skipped test"""
+    if issubclass(err[0], SkipTest):
+        return "skip"
+    return "error"
+
+def _message(err):
+    """return the first line of the exception message"""
+    lines = str(err[1]).strip().splitlines()
+    return f"{err[0].__name__}: {lines[0] if lines else ''}"
+
+def _context_name(suite):
+    """return the name of the module or class of the suite, e.g. test_gpg or test_gpg.TestGPG"""
+    context = getattr(suite, "context", None)
+    if context is None:
+        return suite.id()
+    if isinstance(context, type):
+        return f"{context.__module__}.{context.__name__}"
+    return getattr(context, "__name__", suite.id())
+
+class EventStream(Plugin):
+    """write an event to a JSON lines file as each test starts and finishes"""
+    name = "rhuievents"
+    # go before the other plugins; if one of them returns something, the rest are not called
+    score = 5000
+
+    def __init__(self):
+        super().__init__()
+        self.path = None
+        self.fd = None
+        self.current = {}
+        self.counts = {}
+        self.started = None
+
+    def options(self, parser, env):
+        """add the command line options"""
+        super().options(parser, env)
+        parser.add_option("--rhuievents-file",
+                          default=env.get("NOSE_RHUIEVENTS_FILE", EVENTS_FILE),
+                          dest="rhuievents_file",
+                          metavar="FILE",
+                          help="append the events to this file [NOSE_RHUIEVENTS_FILE]")
+
+    def configure(self, options, conf):
+        """take the options, and start collecting remote operation stats if enabled"""
+        super().configure(options, conf)
+        if self.enabled:
+            self.path = options.rhuievents_file
+            Timing.enable()
+
+    def _emit(self, event, **fields):
+        """append one event to the file"""
+        # one write per line to a file opened with O_APPEND, so that concurrent nose processes
+        # (running tests on several clients) can share the file without mixing up the lines
+        record = {"event": event,
+                  "time": round(time.time(), 6),
+                  "pid": os.getpid(),
+                  "host": socket.gethostname(),
+                  "client": os.getenv("RHUICLI")}
+        record.update(fields)
+        os.write(self.fd, (json.dumps(record) + "\n").encode())
+
+    def begin(self):
+        """open the file and write the event of the start of the run"""
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self.started = time.monotonic()
+        self.counts = {"pass": 0, "fail": 0, "error": 0, "skip": 0}
+        self._emit("run_start")
+
+    def startTest(self, test): # pylint: disable=invalid-name
+        """write the event of the start of the test"""
+        # the remote operations done between the tests (in module setups etc.) are not counted
+        Timing.take_stats()
+        self.current = {"test": test.id(), "outcome": "pass", "message": None,
+                        "started": time.monotonic()}
+        self._emit("test_start", test=test.id())
+
+    def _context_error(self, test, outcome, err):
+        """write the event of a problem outside of any test, e.g. in a module setup"""
+        # nose reports such problems on the module or class suite without starting a test
+        self.counts[outcome] += 1
+        self._emit("context_error",
+                   test=_context_name(test),
+                   outcome=outcome,
+                   message=_message(err),
+                   remote=Timing.take_stats())
+
+    def addError(self, test, err): # pylint: disable=invalid-name
+        """note the error or the skip"""
+        if self.current.get("test") == test.id():
+            self.current["outcome"] = _outcome(err)
+            self.current["message"] = _message(err)
+        elif not self.current:
+            self._context_error(test, _outcome(err), err)
+
+    def addFailure(self, test, err): # pylint: disable=invalid-name
+        """note the failure"""
+        if self.current.get("test") == test.id():
+            self.current["outcome"] = "fail"
+            self.current["message"] = _message(err)
+        elif not self.current:
+            self._context_error(test, "fail", err)
+
+    def stopTest(self, test): # pylint: disable=invalid-name
+        """write the event of the end of the test, with the stats of its remote operations"""
+        if self.current.get("test") != test.id():
+            return
+        outcome = self.current["outcome"]
+        self.counts[outcome] += 1
+        self._emit("test_finish",
+                   test=test.id(),
+                   outcome=outcome,
+                   duration=round(time.monotonic() - self.current["started"], 6),
+                   message=self.current["message"],
+                   remote=Timing.take_stats())
+        self.current = {}
+
+    def finalize(self, result):
+        """write the event of the end of the run, and close the file"""
+        self._emit("run_finish",
+                   duration=round(time.monotonic() - self.started, 6),
+                   successful=result.wasSuccessful(),
+                   **self.counts)
+        os.close(self.fd)
+        self.fd = None
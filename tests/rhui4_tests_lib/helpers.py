@@ -7,6 +7,7 @@ from stitches.expect import Expect, ExpectFailed
 import nose
 import yaml
 
+from rhui4_tests_lib.artifacts import Artifacts
 from rhui4_tests_lib.cfg import Config, LEGACY_CA_DIR, RHUI_ROOT
 from rhui4_tests_lib.incontainers import RhuiinContainers
 
@@ -188,11 +189,8 @@ class Helpers():
     @staticmethod
     def get_artifacts(connection):
         """return a list of all artifacts"""
-        basedir = f"{RHUI_ROOT}/pulp3/artifact/"
-        _, stdout, _ = connection.exec_command(f"find {basedir} -type f")
-        artifacts_full_paths = stdout.read().decode().splitlines()
-        artifacts = [artifact.replace(basedir, "") for artifact in artifacts_full_paths]
-        return artifacts
+        # to go through the artifacts without listing them all, use Artifacts.iterate
+        return [artifact.path for artifact in Artifacts.iterate(connection)]
 
     @staticmethod
     def clear_symlinks(connection):
@@ -0,0 +1,154 @@
+"""Local SQLite History of Test Durations"""
+
+from collections import namedtuple
+from contextlib import closing
+import json
+import os
+from os.path import dirname
+from statistics import median
+import sqlite3
+import time
+import xml.etree.ElementTree as ET
+
+HISTORY_FILE = "/var/cache/rhui4_tests/history.sqlite"
+
+# use this many most recent runs of a test to predict its duration
+RECENT_RUNS = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, started REAL, rhua_version TEXT,
+                                 rhel_version TEXT);
+CREATE TABLE IF NOT EXISTS results (run_id INTEGER, module TEXT, test TEXT, duration REAL,
+                                    outcome TEXT);
+CREATE INDEX IF NOT EXISTS results_test ON results (test);
+CREATE INDEX IF NOT EXISTS results_module ON results (module);
+CREATE TABLE IF NOT EXISTS green (module TEXT PRIMARY KEY, passed REAL, inputs TEXT);
+"""
+
+# the result of one test: the module (file name without .py), the test ID, its duration
+# in seconds, and the outcome: "pass", "fail", "error", or "skip"
+TestResult = namedtuple("TestResult", ["module", "test", "duration", "outcome"])
+# a test that took significantly longer in the run than usual
+Regression = namedtuple("Regression", ["test", "usual", "duration"])
+
+def _connect(history_file):
+    """open the history database, create it first if it does not exist"""
+    if dirname(history_file):
+        os.makedirs(dirname(history_file), exist_ok=True)
+    database = sqlite3.connect(history_file)
+    database.executescript(SCHEMA)
+    return database
+
+def _recent_durations(database, column, value, rhua_version, rhel_version, exclude_run=None):
+    """return the durations of the module or test in recent runs, ideally with these versions"""
+    # a module takes as long as its tests together; each client is recorded as a separate run,
+    # but older runs hold the results of all the clients, so the average per client is taken
+    sql = "SELECT SUM(duration) * COUNT(DISTINCT test) / COUNT(*) " \
+          "FROM results JOIN runs ON runs.id = results.run_id " \
+          f"WHERE results.{column} = ? AND outcome != 'skip' AND runs.id != ? {{}} " \
+          "GROUP BY runs.id ORDER BY runs.started DESC LIMIT ?"
+    params = (value, -1 if exclude_run is None else exclude_run)
+    rows = database.execute(sql.format("AND rhua_version = ? AND rhel_version = ?"),
+                            params + (rhua_version, rhel_version, RECENT_RUNS)).fetchall()
+    if not rows:
+        # no history with these versions; other versions are better than nothing
+        rows = database.execute(sql.format(""), params + (RECENT_RUNS,)).fetchall()
+    return [row[0] for row in rows]
+
+class TestHistory():
+    """record test durations across runs, and use them to predict durations"""
+    @staticmethod
+    def read_xunit(path):
+        """yield TestResults from the given nose xunit report"""
+        for testcase in ET.parse(path).getroot().iter("testcase"):
+            classname = testcase.get("classname", "")
+            if testcase.find("skipped") is not None:
+                outcome = "skip"
+            elif testcase.find("failure") is not None:
+                outcome = "fail"
+            elif testcase.find("error") is not None:
+                outcome = "error"
+            else:
+                outcome = "pass"
+            yield TestResult(classname.split(".")[0],
+                             f"{classname}.{testcase.get('name')}",
+                             float(testcase.get("time", 0)),
+                             outcome)
+
+    @staticmethod
+    def record(results, rhua_version, rhel_version, history_file=HISTORY_FILE):
+        """store the TestResults of a run, return the ID of the run"""
+        with closing(_connect(history_file)) as database, database:
+            run_id = database.execute("INSERT INTO runs (started, rhua_version, rhel_version) " +
+                                      "VALUES (?, ?, ?)",
+                                      (time.time(), rhua_version, rhel_version)).lastrowid
+            database.executemany("INSERT INTO results VALUES (?, ?, ?, ?, ?)",
+                                 [(run_id, *result) for result in results])
+        return run_id
+
+    @staticmethod
+    def predict(modules, rhua_version, rhel_version, history_file=HISTORY_FILE):
+        """return {module: predicted duration in seconds, or None if unknown}"""
+        with closing(_connect(history_file)) as database:
+            predictions = {}
+            for module in modules:
+                durations = _recent_durations(database, "module", module,
+                                              rhua_version, rhel_version)
+                predictions[module] = median(durations) if durations else None
+        return predictions
+
+    @staticmethod
+    def longest_first(modules, rhua_version, rhel_version, history_file=HISTORY_FILE):
+        """return the modules sorted by their predicted durations, the longest first"""
+        # modules with no history go first as they might take long
+        predictions = TestHistory.predict(modules, rhua_version, rhel_version, history_file)
+        return sorted(modules,
+                      key=lambda module: (predictions[module] is not None,
+                                          -(predictions[module] or 0)))
+
+    @staticmethod
+    def regressions(run_id, threshold=1.5, min_duration=10, history_file=HISTORY_FILE):
+        """return a list of tests that took threshold times longer than usual in the run"""
+        # usual means the median of the recent runs;
+        # very short tests are ignored as their durations vary too much
+        with closing(_connect(history_file)) as database:
+            run = database.execute("SELECT rhua_version, rhel_version FROM runs WHERE id = ?",
+                                   (run_id,)).fetchone()
+            if not run:
+                raise ValueError(f"There is no run with ID {run_id}.")
+            regressions = []
+            for test, duration in database.execute("SELECT test, duration FROM results " +
+                                                   "WHERE run_id = ? AND outcome != 'skip'",
+                                                   (run_id,)).fetchall():
+                if duration < min_duration:
+                    continue
+                durations = _recent_durations(database, "test", test, *run, exclude_run=run_id)
+                if durations and duration > threshold * median(durations):
+                    regressions.append(Regression(test, median(durations), duration))
+        return sorted(regressions,
+                      key=lambda regression: regression.duration / max(regression.usual, 0.001),
+                      reverse=True)
+
+    @staticmethod
+    def last_run(history_file=HISTORY_FILE):
+        """return the ID of the most recently recorded run, or None"""
+        with closing(_connect(history_file)) as database:
+            row = database.execute("SELECT id FROM runs ORDER BY started DESC LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def record_green(inputs, history_file=HISTORY_FILE):
+        """store the {module: {input: hash}} dict as the inputs of the last green runs"""
+        with closing(_connect(history_file)) as database, database:
+            database.executemany("INSERT OR REPLACE INTO green VALUES (?, ?, ?)",
+                                 [(module, time.time(), json.dumps(module_inputs, sort_keys=True))
+                                  for module, module_inputs in inputs.items()])
+
+    @staticmethod
+    def green_inputs(modules, history_file=HISTORY_FILE):
+        """return {module: {input: hash}} from the last green runs of the modules that have one"""
+        with closing(_connect(history_file)) as database:
+            rows = database.execute("SELECT module, inputs FROM green WHERE module IN " +
+                                    f"({', '.join('?' * len(modules))})",
+                                    list(modules)).fetchall()
+        return {module: json.loads(inputs) for module, inputs in rows}
@@ -0,0 +1,151 @@
+"""Selection of Test Modules Affected by Changes in RHUI Packages, the Library, or the Tests"""
+
+import ast
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+from os.path import basename, dirname, exists, join
+import re
+
+from rhui4_tests_lib.conmgr import ConMgr
+from rhui4_tests_lib.history import HISTORY_FILE, TestHistory
+
+# a test module declares the types of nodes whose packages it tests in a comment like:
+# __depends: rhua cds haproxy cli
+# modules without this declaration are considered to depend on all types of nodes
+DEPENDS_MARKER = re.compile(r"^# __depends:(.*)$", re.MULTILINE)
+
+NODE_TYPES = ("rhua", "cds", "haproxy", "cli")
+
+LIBRARY = "rhui4_tests_lib"
+LIBRARY_DIR = dirname(__file__)
+
+def _file_hash(path):
+    """return the SHA-256 checksum of the file"""
+    with open(path, "rb") as contents:
+        return hashlib.sha256(contents.read()).hexdigest()
+
+def _library_imports(path):
+    """return the names of the library modules imported by the Python file"""
+    with open(path, encoding="utf-8") as source:
+        tree = ast.parse(source.read(), path)
+    imports = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.module and \
+           node.module.split(".")[0] == LIBRARY:
+            if node.module == LIBRARY:
+                imports.update(alias.name for alias in node.names)
+            else:
+                imports.add(node.module.split(".")[1])
+        elif isinstance(node, ast.Import):
+            imports.update(alias.name.split(".")[1] for alias in node.names
+                           if alias.name.startswith(f"{LIBRARY}."))
+    return imports
+
+def _hostnames(node_type):
+    """return the hostnames of the nodes of the given type"""
+    if node_type == "rhua":
+        return [ConMgr.get_rhua_hostname()]
+    if node_type == "cds":
+        return ConMgr.get_cds_hostnames(fake=False)
+    if node_type == "haproxy":
+        return ConMgr.get_haproxy_hostnames(fake=False)
+    return ConMgr.get_cli_hostnames(fake=False)
+
+def _rpm_hash(hostname):
+    """return a checksum of the list of packages installed on the node"""
+    connection = ConMgr.connect(hostname)
+    try:
+        _, stdout, _ = connection.exec_command("rpm -qa | sort")
+        return hashlib.sha256(stdout.read()).hexdigest()
+    finally:
+        connection.disconnect()
+
+class Impact():
+    """find out which test modules have had their inputs changed since their last green run"""
+    @staticmethod
+    def read_node_types(path):
+        """return the types of nodes the test module depends on, or all if it declares none"""
+        with open(path, encoding="utf-8") as module:
+            match = DEPENDS_MARKER.search(module.read())
+        if not match:
+            return set(NODE_TYPES)
+        node_types = set(match.group(1).split())
+        unknown = node_types - set(NODE_TYPES)
+        if unknown:
+            raise ValueError(f"{path} declares unknown node types: {', '.join(sorted(unknown))}")
+        return node_types
+
+    @staticmethod
+    def library_dependencies(path, library_dir=LIBRARY_DIR):
+        """return the names of the library modules the file uses, directly or indirectly"""
+        dependencies = set()
+        pending = _library_imports(path)
+        while pending:
+            name = pending.pop()
+            dependencies.add(name)
+            library_file = join(library_dir, f"{name}.py")
+            if exists(library_file):
+                pending |= _library_imports(library_file) - dependencies
+        return dependencies
+
+    @staticmethod
+    def rpm_hashes(node_types=NODE_TYPES, workers=8):
+        """return {node type: checksum of the lists of packages on all the nodes of the type}"""
+        hostnames = {node_type: _hostnames(node_type) for node_type in node_types}
+        all_hostnames = sorted({hostname for names in hostnames.values() for hostname in names})
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # an unreachable node counts as changed
+            futures = {hostname: executor.submit(_rpm_hash, hostname)
+                       for hostname in all_hostnames}
+            node_hashes = {}
+            for hostname, future in futures.items():
+                try:
+                    node_hashes[hostname] = future.result()
+                except Exception: # pylint: disable=broad-except
+                    node_hashes[hostname] = "unreachable"
+        return {node_type: hashlib.sha256(" ".join(f"{hostname}:{node_hashes[hostname]}"
+                                                   for hostname in names).encode()).hexdigest()
+                for node_type, names in hostnames.items()}
+
+    @staticmethod
+    def fingerprints(test_dir, modules, rpm_hashes, library_dir=LIBRARY_DIR):
+        """return {module file name: {input: hash}} for the test modules in the directory"""
+        fingerprints = {}
+        for module in modules:
+            path = join(test_dir, module)
+            inputs = {f"test:{module}": _file_hash(path)}
+            for name in Impact.library_dependencies(path, library_dir):
+                library_file = join(library_dir, f"{name}.py")
+                if exists(library_file):
+                    inputs[f"lib:{basename(library_file)}"] = _file_hash(library_file)
+            for node_type in Impact.read_node_types(path):
+                inputs[f"rpms:{node_type}"] = rpm_hashes[node_type]
+            fingerprints[module] = inputs
+        return fingerprints
+
+    @staticmethod
+    def changes(fingerprints, history_file=HISTORY_FILE):
+        """return {module: list of changed inputs} for the modules that need to run"""
+        # a module that has never passed needs to run, too, with "no green run" as the reason
+        green = TestHistory.green_inputs(list(fingerprints), history_file)
+        changes = {}
+        for module, inputs in fingerprints.items():
+            if module not in green:
+                changes[module] = ["no green run"]
+                continue
+            changed = sorted(name for name in set(inputs) | set(green[module])
+                             if inputs.get(name) != green[module].get(name))
+            if changed:
+                changes[module] = changed
+        return changes
+
+    @staticmethod
+    def record(results, fingerprints, history_file=HISTORY_FILE):
+        """store the fingerprints of the modules whose TestResults all passed, return them"""
+        outcomes = {}
+        for result in results:
+            outcomes.setdefault(f"{result.module}.py", set()).add(result.outcome)
+        green = [module for module, module_outcomes in outcomes.items()
+                 if module in fingerprints and module_outcomes <= {"pass", "skip"}]
+        TestHistory.record_green({module: fingerprints[module] for module in green}, history_file)
+        return green
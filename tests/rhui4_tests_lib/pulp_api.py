@@ -1,6 +1,9 @@
 """ Functions to interact with the Pulp API """
 
+from collections import namedtuple
+from os.path import basename
 import shlex
+from urllib.parse import urlencode, urlsplit
 
 import json
 from stitches.expect import Expect
@@ -8,6 +11,20 @@ from stitches.expect import Expect
 from rhui4_tests_lib.conmgr import ConMgr
 from rhui4_tests_lib.util import Util
 
+# the Pulp field names of the package attributes that are fetched by default,
+# in the order in which they are stored in the Package records
+PACKAGE_FIELDS = ("name", "epoch", "version", "release", "arch", "location_href", "pkgId")
+
+class Package(namedtuple("Package", ["name", "epoch", "version", "release", "arch",
+                                     "location_href", "checksum"])):
+    """ an RPM package as known to Pulp; unfetched fields are None """
+    __slots__ = ()
+
+    @property
+    def filename(self):
+        """ the file name of the package, as listed by rhui-manager """
+        return basename(self.location_href) if self.location_href else None
+
 def _get_api_base_cmd(connection):
     """get the base command to access the API; you append the required Pulp href to it"""
     admin_password = shlex.quote(Util.get_saved_password(connection))
@@ -15,6 +32,37 @@ def _get_api_base_cmd(connection):
     cacert = "/etc/pki/rhui/certs/ca.crt"
     return f"curl --cacert {cacert} -u admin:{admin_password} https://{rhua_hostname}"
 
+def _get(connection, href, params=None):
+    """send a GET request to the given href with optional query parameters, return the data"""
+    if params:
+        href += "?" + urlencode(params)
+    # the query string can contain characters that are special to the shell
+    cmd = _get_api_base_cmd(connection) + shlex.quote(href)
+    _, stdout, _ = connection.exec_command(cmd)
+    return json.load(stdout)
+
+def _get_all_results(connection, href, params=None):
+    """return the results from all pages of a list response"""
+    data = _get(connection, href, params)
+    results = data["results"]
+    while data["next"]:
+        # the next page is an absolute URL; only the path and the query are needed
+        next_url = urlsplit(data["next"])
+        data = _get(connection, f"{next_url.path}?{next_url.query}")
+        results.extend(data["results"])
+    return results
+
+def _get_package_params(connection, repo, name, version, release):
+    """return query parameters to find the given package(s) in the latest version of the repo"""
+    params = {"repository_version": PulpAPI.get_repo(connection, repo)["latest_version_href"]}
+    if name:
+        params["name"] = name
+    if version:
+        params["version"] = version
+    if release:
+        params["release"] = release
+    return params
+
 class PulpAPI():
     """ Pulp API functions """
     @staticmethod
@@ -34,6 +82,15 @@ class PulpAPI():
         data = json.load(stdout)
         return data["results"]
 
+    @staticmethod
+    def get_repo(connection, repo):
+        """ return information about the repo by its name """
+        repos_href = "/pulp/api/v3/repositories/rpm/rpm/"
+        data = _get(connection, repos_href, {"name": repo})
+        if data["results"]:
+            return data["results"][0]
+        raise RuntimeError(f"{repo} does not exist")
+
     @staticmethod
     def list_repo_versions(connection, repo):
         """ return information about the versions of the given repo """
@@ -57,3 +114,35 @@ class PulpAPI():
         if data["results"]:
             return data["results"][0]
         raise RuntimeError(f"{repo} does not exist")
+
+    @staticmethod
+    def list_distributions(connection):
+        """ return information about all RPM distributions (ie. the served repos) """
+        distributions_href = "/pulp/api/v3/distributions/rpm/rpm/"
+        return _get_all_results(connection, distributions_href, {"limit": 1000})
+
+    @staticmethod
+    def list_packages(connection, repo, name="", version="", release="", fields=PACKAGE_FIELDS):
+        """ return a sorted list of Package records in the latest version of the repo """
+        # the packages can be filtered by their name, version, and release,
+        # and only the given fields (a subset of PACKAGE_FIELDS) are fetched
+        packages_href = "/pulp/api/v3/content/rpm/packages/"
+        params = _get_package_params(connection, repo, name, version, release)
+        params["fields"] = ",".join(fields)
+        # fetch the packages in big chunks to keep the number of requests low
+        params["limit"] = 1000
+        results = _get_all_results(connection, packages_href, params)
+        packages = [Package(*[result.get(field) for field in PACKAGE_FIELDS])
+                    for result in results]
+        return sorted(packages, key=lambda package: [str(item) for item in package])
+
+    @staticmethod
+    def has_package(connection, repo, name, version="", release=""):
+        """ return True if the package is in the latest version of the repo, or False otherwise """
+        packages_href = "/pulp/api/v3/content/rpm/packages/"
+        params = _get_package_params(connection, repo, name, version, release)
+        # only the number of matching packages is interesting
+        params["fields"] = "pulp_href"
+        params["limit"] = 1
+        data = _get(connection, packages_href, params)
+        return data["count"] > 0
@@ -0,0 +1,239 @@
+"""Streaming Reader for Repository Metadata"""
+
+import bz2
+from collections import namedtuple
+from contextlib import contextmanager
+import gzip
+import io
+import lzma
+import xml.etree.ElementTree as ET
+
+import yaml
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from rhui4_tests_lib.cfg import RHUI_ROOT
+from rhui4_tests_lib.pulp_api import Package
+
+NS = {"repo": "http://linux.duke.edu/metadata/repo",
+      "common": "http://linux.duke.edu/metadata/common",
+      "rpm": "http://linux.duke.edu/metadata/rpm"}
+XML_LANG = "{http://www.w3.org/XML/1998/namespace}lang"
+
+Repomd = namedtuple("Repomd", ["revision", "data"])
+RepomdData = namedtuple("RepomdData", ["type", "location", "checksum", "checksum_type",
+                                       "open_checksum", "timestamp", "size"])
+Provide = namedtuple("Provide", ["name", "flags", "epoch", "version", "release"])
+Advisory = namedtuple("Advisory", ["id", "type", "severity", "title", "issued", "packages"])
+Group = namedtuple("Group", ["id", "name", "uservisible", "packages"])
+ModuleStream = namedtuple("ModuleStream", ["name", "stream", "version", "context", "arch"])
+
+# parsed records: {(hostname, path, reader name): (file version, [records])}
+_PARSE_CACHE = {}
+# checksums of the files found in repomd.xml files: {(hostname, path): checksum}
+_REPOMD_CHECKSUMS = {}
+
+def _decompress(raw_file, path):
+    """wrap the raw file object in a decompressing reader according to the file extension"""
+    if path.endswith(".gz"):
+        return gzip.GzipFile(fileobj=raw_file)
+    if path.endswith(".xz"):
+        return lzma.LZMAFile(raw_file)
+    if path.endswith(".bz2"):
+        return bz2.BZ2File(raw_file)
+    if path.endswith(".zst"):
+        if not zstandard:
+            raise RuntimeError(f"Cannot read {path}: the zstandard module is not installed.")
+        return zstandard.ZstdDecompressor().stream_reader(raw_file)
+    return raw_file
+
+def _iterparse(stream, *tags):
+    """yield the (fully parsed) elements with the given tags, discard them afterwards"""
+    # the root element must be cleared too, or else it would keep all the processed elements
+    root = None
+    for event, elem in ET.iterparse(stream, events=("start", "end")):
+        if root is None:
+            root = elem
+        if event == "end" and elem.tag in tags:
+            yield elem
+            root.clear()
+
+def _text(elem, path, default=None):
+    """return the stripped text of the subelement at the path, or the default value"""
+    subelem = elem.find(path, NS)
+    if subelem is None or subelem.text is None:
+        return default
+    return subelem.text.strip()
+
+def _group_name(elem):
+    """return the untranslated name of a comps group"""
+    for name in elem.findall("name"):
+        if XML_LANG not in name.attrib:
+            return name.text.strip() if name.text else ""
+    return ""
+
+def _group(elem):
+    """return a Group record for the comps group element"""
+    return Group(_text(elem, "id"),
+                 _group_name(elem),
+                 _text(elem, "uservisible", "true").lower() == "true",
+                 [packagereq.text.strip()
+                  for packagereq in elem.iterfind("packagelist/packagereq")])
+
+class Repodata():
+    """read repository metadata files (on the RHUA) in a streaming way, one record at a time"""
+    @staticmethod
+    def repo_dir(relative_path):
+        """return the path to the exported repository with the given relative path"""
+        return f"{RHUI_ROOT}/symlinks/pulp/content/{relative_path}"
+
+    @staticmethod
+    @contextmanager
+    def open(connection, path):
+        """open the remote file over SFTP; decompress it on the fly if it is compressed"""
+        raw_file = connection.sftp.open(path, "rb")
+        # read ahead in the background rather than waiting for each chunk
+        raw_file.prefetch()
+        stream = _decompress(raw_file, path)
+        try:
+            yield stream
+        finally:
+            if stream is not raw_file:
+                stream.close()
+            raw_file.close()
+
+    @staticmethod
+    def repomd(connection, repo_dir):
+        """return the revision and a dict of data types: records from the repomd.xml file"""
+        with Repodata.open(connection, f"{repo_dir}/repodata/repomd.xml") as stream:
+            return Repodata.parse_repomd(stream)
+
+    @staticmethod
+    def parse_repomd(stream):
+        """return the revision and a dict of data types: records from the repomd.xml stream"""
+        root = ET.parse(stream).getroot()
+        data = {}
+        for elem in root.findall("repo:data", NS):
+            checksum = elem.find("repo:checksum", NS)
+            data[elem.get("type")] = RepomdData(elem.get("type"),
+                                                elem.find("repo:location", NS).get("href"),
+                                                checksum.text.strip(),
+                                                checksum.get("type"),
+                                                _text(elem, "repo:open-checksum"),
+                                                int(_text(elem, "repo:timestamp", 0)),
+                                                int(_text(elem, "repo:size", 0)))
+        return Repomd(_text(root, "repo:revision"), data)
+
+    @staticmethod
+    def location(connection, repo_dir, datatype):
+        """return the path to the file of the given data type in the repo, or None"""
+        # data types are : filelists, group, primary, updateinfo etc.
+        data = Repodata.repomd(connection, repo_dir).data
+        if datatype in data:
+            path = f"{repo_dir}/{data[datatype].location}"
+            # remember the checksum so that the file can be cached without checking it again
+            _REPOMD_CHECKSUMS[(connection.hostname, path)] = data[datatype].checksum
+            return path
+        return None
+
+    @staticmethod
+    def cached(connection, path, reader, checksum=""):
+        """return a list of the records yielded by the reader
+
+        the records are reused if the file is unchanged
+        """
+        # the reader is one of the record-yielding methods of this class, e.g. Repodata.comps;
+        # the file is considered unchanged if it has the same checksum as before (given,
+        # or known from repomd.xml if the file was found by Repodata.location), or otherwise,
+        # the same mtime and size
+        checksum = checksum or _REPOMD_CHECKSUMS.get((connection.hostname, path))
+        if checksum:
+            version = checksum
+        else:
+            stat = connection.sftp.stat(path)
+            version = (stat.st_mtime, stat.st_size)
+        key = (connection.hostname, path, reader.__name__)
+        if key not in _PARSE_CACHE or _PARSE_CACHE[key][0] != version:
+            _PARSE_CACHE[key] = (version, list(reader(connection, path)))
+        return list(_PARSE_CACHE[key][1])
+
+    @staticmethod
+    def packages(connection, path, provides=False):
+        """yield Package records from the given primary.xml file"""
+        # if provides is True, yield (Package, [Provide, ...]) tuples instead
+        with Repodata.open(connection, path) as stream:
+            for elem in _iterparse(stream, f"{{{NS['common']}}}package"):
+                version = elem.find("common:version", NS)
+                package = Package(_text(elem, "common:name"),
+                                  version.get("epoch"),
+                                  version.get("ver"),
+                                  version.get("rel"),
+                                  _text(elem, "common:arch"),
+                                  elem.find("common:location", NS).get("href"),
+                                  _text(elem, "common:checksum"))
+                if not provides:
+                    yield package
+                    continue
+                entries = elem.findall("common:format/rpm:provides/rpm:entry", NS)
+                yield package, [Provide(entry.get("name"),
+                                        entry.get("flags"),
+                                        entry.get("epoch"),
+                                        entry.get("ver"),
+                                        entry.get("rel")) for entry in entries]
+
+    @staticmethod
+    def advisories(connection, path):
+        """yield Advisory records from the given updateinfo.xml file"""
+        with Repodata.open(connection, path) as stream:
+            for elem in _iterparse(stream, "update"):
+                issued = elem.find("issued")
+                yield Advisory(_text(elem, "id"),
+                               elem.get("type"),
+                               _text(elem, "severity"),
+                               _text(elem, "title"),
+                               issued.get("date") if issued is not None else None,
+                               [_text(package, "filename")
+                                for package in elem.iterfind("pkglist/collection/package")])
+
+    @staticmethod
+    def comps(connection, path):
+        """yield Group records and (name, install) langpack tuples from the given comps.xml file"""
+        # both are read in a single pass, so that one cached parse serves either of them
+        with Repodata.open(connection, path) as stream:
+            for elem in _iterparse(stream, "group", "match"):
+                if elem.tag == "group":
+                    yield _group(elem)
+                else:
+                    yield elem.get("name"), elem.get("install")
+
+    @staticmethod
+    def groups(connection, path):
+        """yield Group records from the given comps.xml file"""
+        with Repodata.open(connection, path) as stream:
+            for elem in _iterparse(stream, "group"):
+                yield _group(elem)
+
+    @staticmethod
+    def langpacks(connection, path):
+        """yield (name, install) tuples for the langpacks from the given comps.xml file"""
+        with Repodata.open(connection, path) as stream:
+            for elem in _iterparse(stream, "match"):
+                yield elem.get("name"), elem.get("install")
+
+    @staticmethod
+    def module_streams(connection, path):
+        """yield ModuleStream records from the given modules.yaml file"""
+        with Repodata.open(connection, path) as stream:
+            # the documents are loaded one by one; only modulemd documents describe streams
+            for document in yaml.safe_load_all(io.TextIOWrapper(stream, encoding="utf-8")):
+                if not document or document.get("document") != "modulemd":
+                    continue
+                data = document["data"]
+                yield ModuleStream(data["name"],
+                                   str(data["stream"]),
+                                   data.get("version"),
+                                   data.get("context"),
+                                   data.get("arch"))
@@ -0,0 +1,130 @@
+"""Consistency Check of Exported and Served Repository Metadata"""
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+
+import requests
+
+from rhui4_tests_lib.conmgr import ConMgr
+from rhui4_tests_lib.pulp_api import PulpAPI
+from rhui4_tests_lib.repodata import Repodata
+
+# a discrepancy between the RHUA and a node serving the repo:
+# problem is "missing" (the node does not serve the repo),
+# "stale" (the node serves a different revision),
+# "primary" (the node serves a different primary.xml checksum in repomd.xml),
+# or "corrupt" (the primary.xml file served by the node does not match its checksum)
+RepoDiff = namedtuple("RepoDiff", ["node", "relative_path", "problem", "expected", "actual"])
+
+# (revision, primary checksum) of a repo
+RepoState = namedtuple("RepoState", ["revision", "primary"])
+
+def _state(repomd):
+    """return the RepoState for the parsed repomd.xml"""
+    primary = repomd.data.get("primary")
+    return RepoState(repomd.revision, primary.checksum if primary else None)
+
+def _url(node, relative_path, path):
+    """return the URL of the file in the repo served by the node"""
+    return f"https://{node}/pulp/content/{relative_path}/{path}"
+
+def _hash_served_file(session, url, checksum_type, verify):
+    """return the checksum of the file at the URL, or None if it cannot be fetched"""
+    digest = hashlib.new(checksum_type)
+    with session.get(url, stream=True, timeout=60, verify=verify) as response:
+        if not response.ok:
+            return None
+        for chunk in response.iter_content(chunk_size=1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _check(session, node, relative_path, expected, verify, deep):
+    """compare the repo served by the node with the expected Repomd, return a list of RepoDiffs"""
+    expected_state = _state(expected)
+    url = _url(node, relative_path, "repodata/repomd.xml")
+    try:
+        with session.get(url, stream=True, timeout=30, verify=verify) as response:
+            if not response.ok:
+                return [RepoDiff(node, relative_path, "missing", expected_state.revision,
+                                 f"HTTP {response.status_code}")]
+            response.raw.decode_content = True
+            served = Repodata.parse_repomd(response.raw)
+    except requests.exceptions.RequestException as err:
+        return [RepoDiff(node, relative_path, "missing", expected_state.revision, str(err))]
+    served_state = _state(served)
+    if served_state.revision != expected_state.revision:
+        return [RepoDiff(node, relative_path, "stale",
+                         expected_state.revision, served_state.revision)]
+    if served_state.primary != expected_state.primary:
+        return [RepoDiff(node, relative_path, "primary",
+                         expected_state.primary, served_state.primary)]
+    if deep and "primary" in expected.data:
+        primary = expected.data["primary"]
+        try:
+            actual = _hash_served_file(session,
+                                       _url(node, relative_path, primary.location),
+                                       primary.checksum_type,
+                                       verify)
+        except requests.exceptions.RequestException as err:
+            actual = str(err)
+        if actual != primary.checksum:
+            return [RepoDiff(node, relative_path, "corrupt", primary.checksum, actual)]
+    return []
+
+class RepoDiffer():
+    """compare the repos exported on the RHUA with what the CDS and HAProxy nodes serve"""
+    @staticmethod
+    def relative_paths(connection):
+        """return a sorted list of the relative paths of all the repos known to Pulp"""
+        return sorted(distribution["base_path"]
+                      for distribution in PulpAPI.list_distributions(connection))
+
+    @staticmethod
+    def nodes():
+        """return the hostnames of all the nodes serving content: the CDSes and the load balancer"""
+        return ConMgr.get_cds_hostnames(fake=False) + [ConMgr.get_lb_hostname()]
+
+    @staticmethod
+    def rhua_repomds(connection, relative_paths):
+        """return {relative path: Repomd} for the exported repos; unexported repos are omitted"""
+        # the files are read one by one because they all go through the single SFTP session
+        # of the connection, which cannot be shared by several threads; they are small, though
+        repomds = {}
+        for relative_path in relative_paths:
+            try:
+                repomds[relative_path] = Repodata.repomd(connection,
+                                                         Repodata.repo_dir(relative_path))
+            except IOError:
+                pass
+        return repomds
+
+    @staticmethod
+    def diff(connection, relative_paths=None, nodes=None, cert=None, verify=False, deep=False,
+             workers=16):
+        """compare the repos on the RHUA with the served ones, return a sorted list of RepoDiffs"""
+        # by default, all the repos known to Pulp are checked on all the CDS and HAProxy nodes;
+        # protected repos can only be fetched with an entitlement certificate, which is a path
+        # to a PEM file or a (certificate, key) tuple of paths on this machine;
+        # if deep is True, the primary.xml files are also downloaded and their checksums verified
+        if relative_paths is None:
+            relative_paths = RepoDiffer.relative_paths(connection)
+        if nodes is None:
+            nodes = RepoDiffer.nodes()
+        # the RHUA is the source of truth, so an unexported repo is reported as missing there
+        repomds = RepoDiffer.rhua_repomds(connection, relative_paths)
+        diffs = [RepoDiff(ConMgr.get_rhua_hostname(), relative_path, "missing", None, None)
+                 for relative_path in relative_paths if relative_path not in repomds]
+        with requests.Session() as session:
+            session.cert = cert
+            # the connection pool must be big enough for all the workers
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=workers)
+            session.mount("https://", adapter)
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(_check, session, node, relative_path, repomd,
+                                           verify, deep)
+                           for node in nodes
+                           for relative_path, repomd in repomds.items()]
+                for future in futures:
+                    diffs.extend(future.result())
+        return sorted(diffs, key=lambda diff: (diff.relative_path, diff.node))
@@ -0,0 +1,171 @@
+"""Local SQLite Index of Exported Repository Metadata"""
+
+from contextlib import closing
+import os
+from os.path import join
+import sqlite3
+
+from rhui4_tests_lib.pulp_api import Package
+from rhui4_tests_lib.repodata import Repodata
+from rhui4_tests_lib.util import Util
+
+INDEX_DIR = "/var/cache/rhui4_tests/repoindex"
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE packages (id INTEGER PRIMARY KEY, name TEXT, epoch TEXT, version TEXT,
+                       release TEXT, arch TEXT, location_href TEXT, checksum TEXT);
+CREATE TABLE provides (package_id INTEGER, name TEXT, flags TEXT, epoch TEXT,
+                       version TEXT, release TEXT);
+CREATE TABLE advisories (id TEXT PRIMARY KEY, type TEXT, severity TEXT, title TEXT,
+                         issued TEXT);
+CREATE TABLE advisory_packages (advisory_id TEXT, filename TEXT);
+CREATE TABLE comps_groups (id TEXT PRIMARY KEY, name TEXT, uservisible INTEGER);
+CREATE TABLE group_packages (group_id TEXT, package TEXT);
+CREATE TABLE module_streams (name TEXT, stream TEXT, version INTEGER, context TEXT, arch TEXT);
+CREATE INDEX packages_name ON packages (name);
+CREATE INDEX provides_name ON provides (name);
+CREATE INDEX advisory_packages_filename ON advisory_packages (filename);
+CREATE INDEX group_packages_group_id ON group_packages (group_id);
+CREATE INDEX module_streams_name ON module_streams (name);
+"""
+
+def _get_revision(index_file):
+    """return the repomd revision the existing index was built from, or None"""
+    if not os.path.exists(index_file):
+        return None
+    with closing(sqlite3.connect(index_file)) as database:
+        try:
+            row = database.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()
+        except sqlite3.DatabaseError:
+            # a broken or foreign file; it will be rebuilt
+            return None
+    return row[0] if row else None
+
+def _fill(database, connection, repo_dir, repomd):
+    """load the records from all the known metadata files of the repo into the database"""
+    def location(datatype):
+        return f"{repo_dir}/{repomd.data[datatype].location}"
+
+    database.executemany("INSERT INTO meta VALUES (?, ?)",
+                         [("repo_dir", repo_dir), ("revision", repomd.revision)])
+    if "primary" in repomd.data:
+        for package_id, (package, provides) in enumerate(Repodata.packages(connection,
+                                                                           location("primary"),
+                                                                           provides=True)):
+            database.execute("INSERT INTO packages VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             (package_id, *package))
+            database.executemany("INSERT INTO provides VALUES (?, ?, ?, ?, ?, ?)",
+                                 [(package_id, *provide) for provide in provides])
+    if "updateinfo" in repomd.data:
+        for advisory in Repodata.advisories(connection, location("updateinfo")):
+            database.execute("INSERT OR REPLACE INTO advisories VALUES (?, ?, ?, ?, ?)",
+                             advisory[:-1])
+            database.executemany("INSERT INTO advisory_packages VALUES (?, ?)",
+                                 [(advisory.id, filename) for filename in advisory.packages])
+    if "group" in repomd.data:
+        for group in Repodata.groups(connection, location("group")):
+            database.execute("INSERT OR REPLACE INTO comps_groups VALUES (?, ?, ?)",
+                             (group.id, group.name, group.uservisible))
+            database.executemany("INSERT INTO group_packages VALUES (?, ?)",
+                                 [(group.id, package) for package in group.packages])
+    if "modules" in repomd.data:
+        database.executemany("INSERT INTO module_streams VALUES (?, ?, ?, ?, ?)",
+                             Repodata.module_streams(connection, location("modules")))
+
+class RepoIndex():
+    """build and query a local SQLite index of the metadata of an exported repository"""
+    @staticmethod
+    def index_file(relative_path, index_dir=INDEX_DIR):
+        """return the path to the local index file for the repo with the given relative path"""
+        return join(index_dir, Util.safe_pulp_repo_name(relative_path) + ".sqlite")
+
+    @staticmethod
+    def build(connection, relative_path, index_dir=INDEX_DIR, force=False):
+        """(re)build the index of the exported repo unless it is up to date, return its path"""
+        # the repo must have been exported so that its metadata is available in the symlink tree
+        repo_dir = Repodata.repo_dir(relative_path)
+        repomd = Repodata.repomd(connection, repo_dir)
+        index_file = RepoIndex.index_file(relative_path, index_dir)
+        if not force and _get_revision(index_file) == repomd.revision:
+            return index_file
+        os.makedirs(index_dir, exist_ok=True)
+        # build a new index next to the old one and replace the old one only when it's complete
+        new_index_file = index_file + ".new"
+        if os.path.exists(new_index_file):
+            os.unlink(new_index_file)
+        with closing(sqlite3.connect(new_index_file)) as database:
+            database.executescript(SCHEMA)
+            with database:
+                _fill(database, connection, repo_dir, repomd)
+        os.replace(new_index_file, index_file)
+        return index_file
+
+    @staticmethod
+    def query(index_file, sql, params=()):
+        """run an arbitrary SQL query against the index, return a list of rows (tuples)"""
+        with closing(sqlite3.connect(index_file)) as database:
+            return database.execute(sql, params).fetchall()
+
+    @staticmethod
+    def revision(index_file):
+        """return the repomd revision the index was built from"""
+        return _get_revision(index_file)
+
+    @staticmethod
+    def packages(index_file, name=""):
+        """return a sorted list of Package records in the repo, optionally only with this name"""
+        sql = "SELECT name, epoch, version, release, arch, location_href, checksum FROM packages"
+        if name:
+            rows = RepoIndex.query(index_file, sql + " WHERE name = ?", (name,))
+        else:
+            rows = RepoIndex.query(index_file, sql)
+        return sorted(Package(*row) for row in rows)
+
+    @staticmethod
+    def whatprovides(index_file, capability):
+        """return a sorted list of names of packages providing the given capability"""
+        rows = RepoIndex.query(index_file,
+                               "SELECT DISTINCT packages.name FROM packages " +
+                               "JOIN provides ON packages.id = provides.package_id " +
+                               "WHERE provides.name = ?",
+                               (capability,))
+        return sorted(row[0] for row in rows)
+
+    @staticmethod
+    def advisories(index_file, filename=""):
+        """return a sorted list of advisory IDs, optionally only those fixing the given RPM file"""
+        if filename:
+            rows = RepoIndex.query(index_file,
+                                   "SELECT DISTINCT advisory_id FROM advisory_packages " +
+                                   "WHERE filename = ?",
+                                   (filename,))
+        else:
+            rows = RepoIndex.query(index_file, "SELECT id FROM advisories")
+        return sorted(row[0] for row in rows)
+
+    @staticmethod
+    def grouplist(index_file, uservisible_only=True):
+        """return a sorted list of the names of the groups in the repo"""
+        sql = "SELECT name FROM comps_groups"
+        if uservisible_only:
+            sql += " WHERE uservisible"
+        return sorted(row[0] for row in RepoIndex.query(index_file, sql))
+
+    @staticmethod
+    def group_packages(index_file, group):
+        """return a sorted list of packages in the group with the given name"""
+        rows = RepoIndex.query(index_file,
+                               "SELECT DISTINCT package FROM group_packages " +
+                               "JOIN comps_groups ON comps_groups.id = group_packages.group_id " +
+                               "WHERE comps_groups.name = ?",
+                               (group,))
+        return sorted(row[0] for row in rows)
+
+    @staticmethod
+    def module_streams(index_file, name):
+        """return a sorted list of the streams of the given module"""
+        rows = RepoIndex.query(index_file,
+                               "SELECT DISTINCT stream FROM module_streams WHERE name = ?",
+                               (name,))
+        return sorted(row[0] for row in rows)
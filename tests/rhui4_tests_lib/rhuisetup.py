@@ -0,0 +1,122 @@
+"""State-Aware Setup of the RHUI Environment"""
+
+from collections import namedtuple
+import json
+from os import getenv
+
+from rhui4_tests_lib.conmgr import ConMgr
+from rhui4_tests_lib.rhuimanager import RHUIManager
+from rhui4_tests_lib.rhuimanager_cmdline import RHUIManagerCLI, DEFAULT_ENT_CERT
+from rhui4_tests_lib.rhuimanager_cmdline_instance import RHUIManagerCLIInstance
+from rhui4_tests_lib.util import Util
+
+CDS_JSON = "/etc/rhui/cds.json"
+HAPROXY_JSON = "/etc/rhui/haproxy.json"
+RH_CERT_DIR = "/etc/pki/rhui/redhat"
+
+# what the RHUA looks like: whether rhui-manager is logged in, the checksums of the uploaded
+# entitlement certificates, {hostname: record from cds.json}, and a list of HAProxy hostnames
+SetupState = namedtuple("SetupState", ["logged_in", "certs", "cds", "haproxy"])
+
+def _load_json_list(connection, path):
+    """return the list stored in the JSON file on the remote host, or [] if there's no such file"""
+    try:
+        with connection.sftp.open(path) as json_file:
+            return json.load(json_file) or []
+    except IOError:
+        return []
+
+def _checksums(connection, paths):
+    """return a set of SHA-256 checksums of the given remote files (a shell pattern is OK)"""
+    _, stdout, _ = connection.exec_command(f"sha256sum {paths} 2> /dev/null")
+    return {line.split()[0] for line in stdout.read().decode().splitlines() if line}
+
+def _cds_matches(record, container, ssl_crt, ssl_key):
+    """return True if the CDS described by the record from cds.json is deployed as requested"""
+    # the record does not mention the certificate and key paths if they were not supplied
+    return bool(record.get("container")) == container and \
+           (record.get("user_supplied_ssl_crt") or "") == ssl_crt and \
+           (record.get("user_supplied_ssl_key") or "") == ssl_key
+
+class RHUISetup():
+    """bring the RHUA to the desired state, skipping the steps that have been done already"""
+    @staticmethod
+    def read_state(connection):
+        """return the current SetupState of the RHUA"""
+        cds = {record["hostname"]: record for record in _load_json_list(connection, CDS_JSON)}
+        haproxy = [record["hostname"] for record in _load_json_list(connection, HAPROXY_JSON)]
+        return SetupState(Util.is_logged_in(connection),
+                          _checksums(connection, f"{RH_CERT_DIR}/*.pem"),
+                          cds,
+                          haproxy)
+
+    @staticmethod
+    def ensure(connection, cert=DEFAULT_ENT_CERT, cds_hostnames=None, haproxy=True,
+               container=False, ssl_crt="", ssl_key="", state=None):
+        """perform only the missing setup steps, return a list of the steps that were performed"""
+        # use cert="" to skip the certificate upload, and cds_hostnames=[] to skip adding CDSes;
+        # by default, the first CDS node in the stack is added;
+        # a CDS that has been added with different parameters (native vs. containerized,
+        # other SSL certificate) is reinstalled; an already read state can be passed to save time
+        if state is None:
+            state = RHUISetup.read_state(connection)
+        if cds_hostnames is None:
+            cds_hostnames = ConMgr.get_cds_hostnames()[:1]
+        steps = []
+        if not state.logged_in:
+            RHUIManager.initial_run(connection)
+            steps.append("log in")
+        if cert and not _checksums(connection, cert) & state.certs:
+            RHUIManagerCLI.cert_upload(connection, cert)
+            steps.append(f"upload {cert}")
+        for cds in cds_hostnames:
+            if cds in state.cds and _cds_matches(state.cds[cds], container, ssl_crt, ssl_key):
+                continue
+            status = RHUIManagerCLIInstance.add(connection,
+                                                "cds",
+                                                cds,
+                                                container=container,
+                                                ssl_crt=ssl_crt,
+                                                ssl_key=ssl_key,
+                                                force=cds in state.cds,
+                                                unsafe=True)
+            if not status:
+                raise RuntimeError(f"Failed to add {cds}.")
+            steps.append(f"{'reinstall' if cds in state.cds else 'add'} {cds}")
+        if haproxy:
+            ha_hostname = ConMgr.get_lb_hostname()
+            if ha_hostname not in state.haproxy:
+                if not RHUIManagerCLIInstance.add(connection, "haproxy", ha_hostname, unsafe=True):
+                    raise RuntimeError(f"Failed to add {ha_hostname}.")
+                steps.append(f"add {ha_hostname}")
+        return steps
+
+    @staticmethod
+    def cleanup_deferred():
+        """return True if the cleanup is to be done at the end of the whole run, or False"""
+        # this is the case when the setup was done beforehand, or if explicitly requested
+        return bool(getenv("RHUISKIPSETUP") or getenv("RHUIDEFERCLEANUP"))
+
+    @staticmethod
+    def cleanup(connection, certs=True, force=False, state=None):
+        """remove the certs and the nodes unless deferred, return a list of the performed steps"""
+        # rhui-manager must be logged in; a node that cannot be deleted raises RuntimeError
+        if RHUISetup.cleanup_deferred() and not force:
+            return []
+        if state is None:
+            state = RHUISetup.read_state(connection)
+        steps = []
+        if certs and state.certs:
+            RHUIManager.remove_rh_certs(connection)
+            steps.append("remove certificates")
+        if state.haproxy:
+            if not RHUIManagerCLIInstance.delete(connection, "haproxy", state.haproxy, force=True):
+                raise RuntimeError(f"Failed to delete {', '.join(state.haproxy)}.")
+            steps.append(f"delete {', '.join(state.haproxy)}")
+        if state.cds:
+            if not RHUIManagerCLIInstance.delete(connection, "cds", list(state.cds), force=True):
+                raise RuntimeError(f"Failed to delete {', '.join(state.cds)}.")
+            steps.append(f"delete {', '.join(state.cds)}")
+        if steps:
+            ConMgr.remove_ssh_keys(connection)
+        return steps
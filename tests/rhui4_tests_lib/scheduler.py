@@ -0,0 +1,111 @@
+"""Scheduling of Test Modules by the RHUI Setup They Need"""
+
+from collections import namedtuple
+from glob import glob
+from itertools import permutations
+from os.path import basename, join
+import re
+
+# a test module declares the fixtures it can share with other modules in a comment like:
+# __fixtures: cert cds haproxy
+# such a module skips its own setup and cleanup if RHUISKIPSETUP is set;
+# modules without this declaration set up and clean up everything themselves,
+# so they need a clean RHUA
+FIXTURES_MARKER = re.compile(r"^# __fixtures:(.*)$", re.MULTILINE)
+
+# estimated time (in seconds) to set up and to clean up each fixture
+FIXTURE_COSTS = {"cert": (15, 5),
+                 "cds": (240, 60),
+                 "haproxy": (120, 30)}
+
+# brute-force the order of this many distinct sets of fixtures at most, guess it otherwise
+MAX_PERMUTED = 8
+
+# a group of modules to run with the given fixtures in place
+Step = namedtuple("Step", ["fixtures", "modules"])
+# the steps in the chosen order, and the estimated setup & cleanup time in total
+# with this order and with the alphabetical order in which each module handles its own fixtures
+Schedule = namedtuple("Schedule", ["steps", "cost", "baseline"])
+
+def _setup_cost(fixtures):
+    """return the estimated time to set up the fixtures"""
+    return sum(FIXTURE_COSTS[fixture][0] for fixture in fixtures)
+
+def _cleanup_cost(fixtures):
+    """return the estimated time to clean up the fixtures"""
+    return sum(FIXTURE_COSTS[fixture][1] for fixture in fixtures)
+
+def _transition_cost(current, target):
+    """return the estimated time to get from the current fixtures to the target ones"""
+    # missing fixtures can be added, but anything else requires a cleanup first
+    if current <= target:
+        return _setup_cost(target - current)
+    return _cleanup_cost(current) + _setup_cost(target)
+
+def _order_cost(order):
+    """return the estimated time of all the transitions, from and back to a clean RHUA"""
+    path = [frozenset()] + list(order) + [frozenset()]
+    return sum(_transition_cost(current, target) for current, target in zip(path, path[1:]))
+
+def _guess_order(fixture_sets):
+    """return an order of the fixture sets made by always taking the cheapest next transition"""
+    remaining = list(fixture_sets)
+    order = []
+    current = frozenset()
+    while remaining:
+        # prefer the bigger set on a tie so as to finish with the clean RHUA
+        remaining.sort(key=lambda target: (_transition_cost(current, target), -len(target)))
+        current = remaining.pop(0)
+        order.append(current)
+    return order
+
+class Scheduler():
+    """order test modules so that the expensive RHUI setup is done as few times as possible"""
+    @staticmethod
+    def read_fixtures(path):
+        """return the fixtures declared in the test module, or an empty set if there are none"""
+        with open(path, encoding="utf-8") as module:
+            match = FIXTURES_MARKER.search(module.read())
+        if not match:
+            return frozenset()
+        fixtures = frozenset(match.group(1).split())
+        unknown = fixtures - set(FIXTURE_COSTS)
+        if unknown:
+            raise ValueError(f"{path} declares unknown fixtures: {', '.join(sorted(unknown))}")
+        return fixtures
+
+    @staticmethod
+    def fixtures(test_dir, modules=None):
+        """return {module file name: fixtures} for the given (or all) test modules in the dir"""
+        if modules is None:
+            modules = [basename(path) for path in glob(join(test_dir, "test_*.py"))]
+        return {module: Scheduler.read_fixtures(join(test_dir, module)) for module in modules}
+
+    @staticmethod
+    def plan(fixtures):
+        """return a Schedule for the {module: fixtures} dict"""
+        groups = {}
+        for module in sorted(fixtures):
+            groups.setdefault(fixtures[module], []).append(module)
+        if len(groups) <= MAX_PERMUTED:
+            order = min(permutations(groups), key=_order_cost)
+        else:
+            order = _guess_order(groups)
+        # without scheduling, each module sets up and cleans up its fixtures by itself
+        baseline = sum(_setup_cost(module_fixtures) + _cleanup_cost(module_fixtures)
+                       for module_fixtures in fixtures.values())
+        return Schedule([Step(step_fixtures, groups[step_fixtures]) for step_fixtures in order],
+                        _order_cost(order),
+                        baseline)
+
+    @staticmethod
+    def setup_args(fixtures):
+        """return a list of rhuitestsetup arguments to get the fixtures in place"""
+        if not fixtures - {"cert"}:
+            return ["--cert-only"]
+        args = []
+        if "cert" not in fixtures:
+            args += ["--cert", "no"]
+        if "haproxy" not in fixtures:
+            args.append("--cds-only")
+        return args
@@ -0,0 +1,69 @@
+"""Splitting of Test Modules Across Test Machines and Merging of Their Results"""
+
+from collections import namedtuple
+import json
+from statistics import median
+import xml.etree.ElementTree as ET
+
+# assume a module with no history takes this long (in seconds) if no module has any history
+DEFAULT_DURATION = 600
+
+# the test machine, the names of the test modules to run on it, and their predicted duration
+Shard = namedtuple("Shard", ["runner", "modules", "predicted"])
+
+# the counters in the root element of a nose xunit report
+XUNIT_COUNTERS = ("tests", "errors", "failures", "skip")
+
+class Sharder():
+    """split test modules across test machines, each with its own RHUI, and merge the results"""
+    @staticmethod
+    def split(predictions, runners):
+        """return a list of Shards for the {module: predicted duration or None} dict"""
+        # the longest modules go first, each to the least loaded runner, which keeps
+        # the longest shard reasonably close to the optimum
+        known = [duration for duration in predictions.values() if duration is not None]
+        default = median(known) if known else DEFAULT_DURATION
+        durations = {module: default if duration is None else duration
+                     for module, duration in predictions.items()}
+        shards = [Shard(runner, [], 0) for runner in runners]
+        for module in sorted(durations, key=lambda module: (-durations[module], module)):
+            index = min(range(len(shards)), key=lambda index: shards[index].predicted)
+            shard = shards[index]
+            shards[index] = Shard(shard.runner, shard.modules + [module],
+                                  shard.predicted + durations[module])
+        return shards
+
+    @staticmethod
+    def merge_xunit(reports, output):
+        """write the test cases from the {runner: xunit report} dict to a single report"""
+        merged = ET.Element("testsuite", name="nosetests")
+        totals = dict.fromkeys(XUNIT_COUNTERS, 0)
+        for runner, report in reports.items():
+            root = ET.parse(report).getroot()
+            for counter in XUNIT_COUNTERS:
+                totals[counter] += int(root.get(counter, 0))
+            for testcase in root.iter("testcase"):
+                # keep the names as they are so that the history of the tests stays the same
+                testcase.set("runner", runner)
+                merged.append(testcase)
+        for counter, total in totals.items():
+            merged.set(counter, str(total))
+        ET.ElementTree(merged).write(output, encoding="UTF-8", xml_declaration=True)
+        return totals
+
+    @staticmethod
+    def merge_events(event_files, output):
+        """write the events from the {runner: JSON lines file} dict to a single file by time"""
+        events = []
+        for runner, event_file in event_files.items():
+            with open(event_file, encoding="utf-8") as lines:
+                for line in lines:
+                    if line.strip():
+                        event = json.loads(line)
+                        event["runner"] = runner
+                        events.append(event)
+        events.sort(key=lambda event: event["time"])
+        with open(output, "w", encoding="utf-8") as merged:
+            for event in events:
+                merged.write(json.dumps(event) + "\n")
+        return len(events)
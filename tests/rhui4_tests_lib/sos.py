@@ -1,16 +1,100 @@
 """Sos in RHUI"""
 
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import json
+from os.path import basename, join
 import re
+import tarfile
 
 import nose
 
+from rhui4_tests_lib.conmgr import ConMgr
+
+# the plug-ins to collect the data with on each type of node
+NODE_PLUGINS = {"rhua": "nginx,pulpcore,rhui",
+                "cds": "nginx,pulpcore,rhui",
+                "haproxy": "haproxy"}
+
+# the paths of the files in the archive (as on the node) and the contents of the requested ones
+SosIndex = namedtuple("SosIndex", ["archive", "members", "contents"])
+
+# the outcome of collecting a report on a node; the problems are lines with unhidden values
+SosResult = namedtuple("SosResult", ["hostname", "index", "local_file", "problems", "error"])
+
+class _Tee():
+    """file-like object that saves what is read from the source file to the copy"""
+    def __init__(self, source, copy):
+        self.source = source
+        self.copy = copy
+
+    def read(self, size=-1):
+        """read from the source and save the data"""
+        data = self.source.read(size)
+        self.copy.write(data)
+        return data
+
+    def drain(self, chunk_size=1024 * 1024):
+        """save the rest of the source, which the reader did not need"""
+        while self.read(chunk_size):
+            pass
+
+def _strip_top_dir(name):
+    """return the path of the member as on the node"""
+    # the archive contains files like:
+    # sosreport-HOST-DATE-HASH/etc/rhui/rhui-tools.conf
+    # while the paths on the node are like /etc/rhui/rhui-tools.conf
+    return re.sub("^[^/]+", "", name)
+
+def _read_index(fileobj, archive, paths):
+    """return a SosIndex of the archive read from the file object in a single pass"""
+    members = set()
+    contents = {}
+    with tarfile.open(fileobj=fileobj, mode="r|*") as tar:
+        for member in tar:
+            path = _strip_top_dir(member.name)
+            members.add(path)
+            if path in paths and member.isfile():
+                contents[path] = tar.extractfile(member).read().decode(errors="replace")
+    return SosIndex(archive, frozenset(members), contents)
+
+def _unhidden_lines(index, match, path):
+    """return the lines of the indexed file which contain the option with a visible value"""
+    return [line for line in index.contents.get(path, "").splitlines()
+            if match in line and not line.endswith("********")]
+
+def _collect(hostname, node_type, output_dir, confidential, remove):
+    """collect a report on the node, fetch and index it, and check it; return a SosResult"""
+    connection = ConMgr.connect(hostname)
+    try:
+        archive = Sos.run(connection, NODE_PLUGINS[node_type])
+        if not archive:
+            raise RuntimeError("sos report did not print the location of the archive")
+        local_file = join(output_dir, basename(archive))
+        # the archive is indexed while it is being downloaded
+        with connection.sftp.open(archive, "rb") as remote_file, \
+             open(local_file, "wb") as copy:
+            remote_file.prefetch()
+            tee = _Tee(remote_file, copy)
+            index = _read_index(tee, archive, set(confidential))
+            tee.drain()
+        problems = [f"{path}: {line}" for path, options in confidential.items()
+                    for option in options for line in _unhidden_lines(index, option, path)]
+        if remove:
+            connection.recv_exit_status(f"rm -f {archive}*")
+        return SosResult(hostname, index, local_file, problems, None)
+    except Exception as err: # pylint: disable=broad-except
+        return SosResult(hostname, None, None, [], str(err))
+    finally:
+        connection.disconnect()
+
 class Sos():
     """Sos handling for RHUI"""
     @staticmethod
-    def run(connection):
+    def run(connection, plugins=NODE_PLUGINS["rhua"]):
         """run the sosreport command"""
         # now run sosreport with only the relevant plug-ins enabled, return the tarball location
-        _, stdout, _ = connection.exec_command("sos report -o nginx,pulpcore,rhui --batch")
+        _, stdout, _ = connection.exec_command(f"sos report -o {plugins} --batch")
         lines = stdout.read().decode().splitlines()
         # return the line below the one which indicates that the following line contains the path
         see_path = False
@@ -23,33 +107,71 @@ class Sos():
         # the in unlikely event that the output doesn't look as expected, return None
         return None
 
+    @staticmethod
+    def index(connection, archive, paths=()):
+        """return a SosIndex of the archive on the node, with the contents of the given files"""
+        # the archive is read over SFTP and decompressed once, in a single forward pass,
+        # so the contents of the files to check must be known in advance
+        try:
+            remote_file = connection.sftp.open(archive, "rb")
+        except IOError as err:
+            raise OSError(archive + " does not exist") from err
+        try:
+            remote_file.prefetch()
+            return _read_index(remote_file, archive, paths)
+        finally:
+            remote_file.close()
+
+    @staticmethod
+    def collect(nodes, output_dir, confidential=None, remove=False):
+        """collect reports on the {hostname: node type} nodes at once, return a list of SosResults
+
+        the archives are saved in the output directory and checked for the {path: [options]}
+        confidential data
+        """
+        with ThreadPoolExecutor(max_workers=len(nodes) or 1) as executor:
+            futures = [executor.submit(_collect, hostname, node_type, output_dir,
+                                       confidential or {}, remove)
+                       for hostname, node_type in nodes.items()]
+            return [future.result() for future in futures]
+
+    @staticmethod
+    def write_combined_index(results, path):
+        """save the archives, problems and {file: [hostnames]} of the SosResults as JSON"""
+        hosts = {}
+        members = {}
+        for result in results:
+            hosts[result.hostname] = {"archive": result.index.archive if result.index else None,
+                                      "local_file": result.local_file,
+                                      "problems": result.problems,
+                                      "error": result.error}
+            for member in result.index.members if result.index else []:
+                members.setdefault(member, []).append(result.hostname)
+        with open(path, "w", encoding="utf-8") as index_file:
+            json.dump({"hosts": hosts, "members": dict(sorted(members.items()))},
+                      index_file, indent=1)
+
+    @staticmethod
+    def check_files_in_index(index, filelist):
+        """check if the files in the given filelist are collected in the indexed archive"""
+        missing_files = [f for f in filelist if f not in index.members]
+        nose.tools.ok_(not missing_files,
+                       msg=f"Not found in {index.archive}: {missing_files}")
+
+    @staticmethod
+    def is_obfuscated_in_index(index, match, path):
+        """check if the value of the option in the file (path) in the indexed archive is hidden"""
+        nose.tools.ok_(path in index.contents,
+                       msg=f"{path} was not found in {index.archive} or not indexed")
+        problems = _unhidden_lines(index, match, path)
+        nose.tools.ok_(not problems, msg=f"Problematic lines: {problems}")
+
     @staticmethod
     def check_files_in_archive(connection, filelist, archive):
         """check if the files in the given filelist are collected in the given archive"""
-        # make sure the archive exists
-        if connection.recv_exit_status("test -f " + archive):
-            raise OSError(archive + " does not exist")
-        # read the contents of the archive, and check if each file from the filelist is there
-        # must strip the path in front of the real root directory; the archive contains files like:
-        # sosreport-HOST-DATE-HASH/etc/rhui/rhui-tools.conf
-        # while the given filelist contains actual paths like /etc/rhui/rhui-tools.conf
-        pattern = "^[^/]+"
-        _, stdout, _ = connection.exec_command("tar tf " + archive)
-        archive_filelist_raw = stdout.read().decode().splitlines()
-        archive_filelist = [re.sub(pattern, "", path) for path in archive_filelist_raw]
-        missing_files = [f for f in filelist if f not in archive_filelist]
-        nose.tools.ok_(not missing_files,
-                       msg=f"Not found in the archive: {missing_files}")
+        Sos.check_files_in_index(Sos.index(connection, archive), filelist)
 
     @staticmethod
     def is_obfuscated(connection, match, path, archive):
         """check if the value of the option in the file (path) in the archive is obfuscated"""
-        # make sure the archive exists
-        if connection.recv_exit_status("test -f " + archive):
-            raise OSError(archive + " does not exist")
-        # print the file from the archive
-        cmd = f"tar xf {archive} --wildcards 'sosreport-*{path}' -O"
-        _, stdout, _ = connection.exec_command(cmd)
-        lines = stdout.read().decode().splitlines()
-        problems = [line for line in lines if match in line and not line.endswith("********")]
-        nose.tools.ok_(not problems, msg=f"Problematic lines: {problems}")
+        Sos.is_obfuscated_in_index(Sos.index(connection, archive, [path]), match, path)
@@ -0,0 +1,276 @@
+"""Timing of Remote Operations and Waits"""
+
+from collections import defaultdict, namedtuple
+import json
+import os
+import sys
+import threading
+import time
+
+import paramiko
+from stitches.connection import Connection
+from stitches.expect import Expect
+
+# the operations are only recorded if called from these packages or from test case modules
+OWN_PACKAGES = ("rhui4_tests", "rhui4_tests_lib")
+
+# total duration of the operations of a type on a target (command, pattern, path)
+OperationTotal = namedtuple("OperationTotal", ["op", "target", "count", "bytes", "duration"])
+
+_STATE = threading.local()
+_LOCK = threading.Lock()
+_OUTPUT = {"enabled": False, "file": None}
+# {op: [count, bytes, duration]} since the stats were last taken
+_STATS = defaultdict(lambda: [0, 0, 0.0])
+_ORIGINAL_SLEEP = time.sleep
+
+def _depth():
+    """return the number of instrumented operations in progress in this thread"""
+    return getattr(_STATE, "depth", 0)
+
+def _is_test_module(module):
+    """return True if the module name is that of a test case module"""
+    return module.split(".")[-1].startswith("test_")
+
+def _is_own(frame):
+    """return True if the code in the frame belongs to the test cases or the library"""
+    module = frame.f_globals.get("__name__", "")
+    return module != __name__ and \
+           (module.split(".")[0] in OWN_PACKAGES or _is_test_module(module))
+
+def _stack():
+    """return the test and a list of own functions (outermost first) leading to the operation"""
+    frame = sys._getframe(1) # pylint: disable=protected-access
+    stack = []
+    test = None
+    while frame:
+        if _is_own(frame):
+            module = frame.f_globals["__name__"]
+            code = frame.f_code
+            name = f"{module.split('.')[-1]}.{getattr(code, 'co_qualname', code.co_name)}"
+            stack.append(name)
+            if test is None and _is_test_module(module) and \
+               code.co_name.startswith(("test", "setup", "teardown")):
+                test = name
+        frame = frame.f_back
+    return test, stack[::-1]
+
+def _write(record):
+    """add the record to the stats, and append it to the output file if there is one"""
+    with _LOCK:
+        stats = _STATS[record["op"]]
+        stats[0] += 1
+        stats[1] += record["bytes"] or 0
+        stats[2] += record["duration"]
+        if _OUTPUT["file"]:
+            _OUTPUT["file"].write(json.dumps(record) + "\n")
+            _OUTPUT["file"].flush()
+
+def _record(operation, host, target, start, nbytes=None, stack=None):
+    """write a record of the finished operation"""
+    test, frames = stack or _stack()
+    _write({"time": start,
+            "op": operation,
+            "host": host,
+            "target": target,
+            "bytes": nbytes,
+            "duration": round(time.time() - start, 6),
+            "test": test,
+            "stack": frames})
+
+def _timed(operation, get_host, get_target, get_bytes=None):
+    """return a decorator that records the calls of the function unless nested in another one"""
+    def decorator(function):
+        def wrapper(*args, **kwargs):
+            if _depth():
+                return function(*args, **kwargs)
+            stack = _stack()
+            if not stack[1]:
+                return function(*args, **kwargs)
+            _STATE.depth = 1
+            start = time.time()
+            nbytes = None
+            try:
+                result = function(*args, **kwargs)
+                # some functions, such as SFTPClient.get, return None, so the number of bytes
+                # is found out from the arguments, and only if the function succeeded
+                if get_bytes:
+                    nbytes = get_bytes(result, *args, **kwargs)
+                return result
+            finally:
+                _STATE.depth = 0
+                _record(operation, get_host(*args, **kwargs), get_target(*args, **kwargs), start,
+                        nbytes, stack)
+        wrapper.__wrapped__ = function
+        return wrapper
+    return decorator
+
+def _count_reads(file_obj, operation, host, target, start, stack):
+    """make the file record the number of bytes read from it and the time until EOF or closing"""
+    counter = {"bytes": 0, "done": False}
+
+    def finish():
+        if not counter["done"]:
+            counter["done"] = True
+            _record(operation, host, target, start, counter["bytes"], stack)
+
+    def wrap(method):
+        def wrapper(*args, **kwargs):
+            data = method(*args, **kwargs)
+            if isinstance(data, list):
+                counter["bytes"] += sum(len(item) for item in data)
+            else:
+                counter["bytes"] += len(data)
+            # reading everything or nothing at all means the end of the file
+            if not data or (method.__name__ in ("read", "readlines") and not args and
+                            kwargs.get("size", -1) in (-1, None)):
+                finish()
+            return data
+        return wrapper
+
+    def close_wrapper(close):
+        def wrapper(*args, **kwargs):
+            finish()
+            return close(*args, **kwargs)
+        return wrapper
+
+    for name in ("read", "readline", "readlines"):
+        setattr(file_obj, name, wrap(getattr(file_obj, name)))
+    file_obj.close = close_wrapper(file_obj.close)
+    return file_obj
+
+def _sftp_host(sftp, *_args, **_kwargs):
+    """return the name of the host the SFTP client is connected to"""
+    # the name is the same as for the other operations if the client belongs to a Connection;
+    # otherwise, only the address is known
+    return getattr(sftp, "timing_hostname", None) or \
+           sftp.get_channel().get_transport().getpeername()[0]
+
+def _named_sftp(sftp_property):
+    """return a version of the Connection.sftp property that tags the client with the host name"""
+    def sftp(connection):
+        client = sftp_property.fget(connection)
+        client.timing_hostname = connection.hostname
+        return client
+    return property(sftp)
+
+class Timing():
+    """record how long remote commands, expect calls, SFTP transfers, and sleeps take"""
+    @staticmethod
+    def enable(path=None):
+        """start recording the operations, as JSON lines in the given file if there is one"""
+        # without a file, only the stats are kept
+        if path and not _OUTPUT["file"]:
+            # the file stays open for as long as the tests run
+            # pylint: disable-next=consider-using-with
+            _OUTPUT["file"] = open(path, "a", encoding="utf-8")
+        if _OUTPUT["enabled"]:
+            return
+        _OUTPUT["enabled"] = True
+
+        def connection_host(connection, *_args, **_kwargs):
+            return connection.hostname
+
+        def pattern(_connection, regexp, *_args, **_kwargs):
+            if isinstance(regexp, list):
+                return " | ".join(getattr(item[0], "pattern", str(item[0])) for item in regexp)
+            return getattr(regexp, "pattern", str(regexp))
+
+        def command(_self, cmd, *_args, **_kwargs):
+            return cmd
+
+        def sent_bytes(result, *_args, **_kwargs):
+            return result
+
+        for name in ("expect_list", "expect", "match"):
+            setattr(Expect, name, staticmethod(_timed(f"expect.{name}", connection_host,
+                                                      pattern)(getattr(Expect, name))))
+        Expect.enter = staticmethod(_timed("expect.enter", connection_host, command,
+                                           sent_bytes)(Expect.enter))
+        Connection.recv_exit_status = _timed("recv_exit_status", connection_host,
+                                             command)(Connection.recv_exit_status)
+        Connection.exec_command = Timing._timed_exec_command(Connection.exec_command)
+        Connection.sftp = _named_sftp(Connection.sftp)
+        paramiko.SFTPClient.get = _timed("sftp.get", _sftp_host, command,
+                                         lambda _, sftp, remote, local, *args, **kwargs:
+                                         os.path.getsize(local))(paramiko.SFTPClient.get)
+        paramiko.SFTPClient.put = _timed("sftp.put", _sftp_host,
+                                         lambda _, local, remote, *args, **kwargs: remote,
+                                         lambda result, *args, **kwargs:
+                                         result.st_size)(paramiko.SFTPClient.put)
+        paramiko.SFTPClient.open = Timing._timed_sftp_open(paramiko.SFTPClient.open)
+        time.sleep = _timed("sleep", lambda *args, **kwargs: None,
+                            lambda seconds: str(seconds))(_ORIGINAL_SLEEP)
+
+    @staticmethod
+    def _timed_exec_command(exec_command):
+        """return a version of the method that records the launch and the reading of the output"""
+        def wrapper(connection, command, *args, **kwargs):
+            if _depth():
+                return exec_command(connection, command, *args, **kwargs)
+            stack = _stack()
+            start = time.time()
+            stdin, stdout, stderr = exec_command(connection, command, *args, **kwargs)
+            if stack[1]:
+                _record("exec_command", connection.hostname, command, start, stack=stack)
+                _count_reads(stdout, "exec_command.stdout", connection.hostname, command, start,
+                             stack)
+            return stdin, stdout, stderr
+        wrapper.__wrapped__ = exec_command
+        return wrapper
+
+    @staticmethod
+    def _timed_sftp_open(sftp_open):
+        """return a version of the method that records the bytes read from the remote file"""
+        def wrapper(sftp, filename, mode="r", *args, **kwargs):
+            if _depth() or "r" not in mode:
+                return sftp_open(sftp, filename, mode, *args, **kwargs)
+            stack = _stack()
+            start = time.time()
+            remote_file = sftp_open(sftp, filename, mode, *args, **kwargs)
+            if stack[1]:
+                _count_reads(remote_file, "sftp.read", _sftp_host(sftp), filename, start, stack)
+            return remote_file
+        wrapper.__wrapped__ = sftp_open
+        return wrapper
+
+    @staticmethod
+    def take_stats():
+        """return {op: {"count": ..., "bytes": ..., "duration": ...}} since the last call"""
+        with _LOCK:
+            stats = {op: {"count": count, "bytes": nbytes, "duration": round(duration, 6)}
+                     for op, (count, nbytes, duration) in _STATS.items()}
+            _STATS.clear()
+        return stats
+
+    @staticmethod
+    def load(path):
+        """yield the records from the JSON lines file"""
+        with open(path, encoding="utf-8") as records:
+            for line in records:
+                if line.strip():
+                    yield json.loads(line)
+
+    @staticmethod
+    def summary(path, top=20):
+        """return a list of the top OperationTotals by the total duration"""
+        totals = defaultdict(lambda: [0, 0, 0.0])
+        for record in Timing.load(path):
+            total = totals[(record["op"], record["target"])]
+            total[0] += 1
+            total[1] += record["bytes"] or 0
+            total[2] += record["duration"]
+        ranked = sorted(totals.items(), key=lambda item: item[1][2], reverse=True)
+        return [OperationTotal(op, target, *total) for (op, target), total in ranked[:top]]
+
+    @staticmethod
+    def flamegraph(path, output):
+        """write the records as collapsed stacks (with durations in ms) for flamegraph.pl"""
+        stacks = defaultdict(int)
+        for record in Timing.load(path):
+            frames = record["stack"] + [f"{record['op']} {record['target']}".replace(";", ",")]
+            stacks[";".join(frame.replace("\n", " ") for frame in frames)] += \
+                round(record["duration"] * 1000)
+        with open(output, "w", encoding="utf-8") as collapsed:
+            for stack, duration in sorted(stacks.items()):
+                collapsed.write(f"{stack} {duration}\n")
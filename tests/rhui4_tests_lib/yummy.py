@@ -1,13 +1,36 @@
 """Functions for Yum Commands and Repodata Handling"""
 
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 import time
 
 from stitches.expect import Expect
-import xmltodict
 
-from rhui4_tests_lib.cfg import RHUI_ROOT
+from rhui4_tests_lib.repodata import Group, Repodata
 from rhui4_tests_lib.rhuimanager_cmdline import RHUIManagerCLI
 
+# the outcome of an operation on one client in a batch: the client's host name, the return value
+# or the raised exception, and the time it took (in seconds)
+BatchResult = namedtuple("BatchResult", ["hostname", "result", "error", "duration"])
+
+def _run_on_clients(connections, function, *args, **kwargs):
+    """run the function with each of the connections concurrently, return a list of BatchResults"""
+    # the results are in the order of the connections, one for each, even for the same host
+    def timed_run(connection):
+        start = time.monotonic()
+        try:
+            result = function(connection, *args, **kwargs)
+            error = None
+        # a failure on one client must not prevent the results from the others from being returned
+        except Exception as err: # pylint: disable=broad-except
+            result = None
+            error = err
+        return BatchResult(connection.hostname, result, error, time.monotonic() - start)
+
+    with ThreadPoolExecutor(max_workers=max(len(connections), 1)) as executor:
+        futures = [executor.submit(timed_run, connection) for connection in connections]
+    return [future.result() for future in futures]
+
 class Yummy():
     """various functions to test yum commands and repodata"""
     @staticmethod
@@ -17,60 +40,72 @@ class Yummy():
         # export the repo to make sure the symlinks exist
         RHUIManagerCLI.repo_export(connection, repo)
         time.sleep(3)
-        base_path = f"{RHUI_ROOT}/symlinks/pulp/content"
         relative_path = RHUIManagerCLI.repo_info(connection, repo)["relativepath"]
-        repodata_file = f"{base_path}/{relative_path}/repodata/repomd.xml"
-        _, stdout, _ = connection.exec_command(f"cat {repodata_file}")
-        repodata = xmltodict.parse(stdout.read())
-        location_list = [data["location"]["@href"] for data in repodata["repomd"]["data"] \
-                         if data["@type"] == datatype]
-        if location_list:
-            location = location_list[0]
-            wanted_file = f"{base_path}/{relative_path}/{location}"
-            return wanted_file
-        return None
+        return Repodata.location(connection, Repodata.repo_dir(relative_path), datatype)
 
     @staticmethod
     def comps_xml_grouplist(connection, comps_xml, uservisible_only=True):
         """return a sorted list of yum groups in the given comps.xml file"""
         # by default, only groups with <uservisible>true</uservisible> are taken into account,
         # but those "invisible" can be included too, if requested
-        _, stdout, _ = connection.exec_command(f"cat {comps_xml}")
-        comps = xmltodict.parse(stdout.read())
-        # in a multi-group comps.xml file, the groups are in a list,
-        # whereas in a single-group file, the group is just a string
-        if isinstance(comps["comps"]["group"], list):
-            # get a list of name-visibility pairs first
-            group_info = [[group["name"][0], group["uservisible"].lower() == "true"] \
-                          for group in comps["comps"]["group"]]
-            if uservisible_only:
-                grouplist = [group[0] for group in group_info if group[1]]
-            else:
-                grouplist = [group[0] for group in group_info]
-            return sorted(grouplist)
-        if uservisible_only:
-            if comps["comps"]["group"]["uservisible"].lower() == "true":
-                return [comps["comps"]["group"]["name"][0]]
-            return []
-        return [comps["comps"]["group"]["name"][0]]
+        records = Repodata.cached(connection, comps_xml, Repodata.comps)
+        grouplist = [record.name for record in records
+                     if isinstance(record, Group) and (record.uservisible or not uservisible_only)]
+        return sorted(grouplist)
 
     @staticmethod
     def comps_xml_langpacks(connection, comps_xml):
         """return a list of name, package tuples for the langpacks from the given comps.xml file"""
         # or None if there are no langpacks
-        _, stdout, _ = connection.exec_command(f"cat {comps_xml}")
-        comps = xmltodict.parse(stdout.read())
-        if "langpacks" in comps["comps"] and comps["comps"]["langpacks"]:
-            names_pkgs = [(match["@name"], match["@install"]) \
-                          for match in comps["comps"]["langpacks"]["match"]]
-            return names_pkgs
-        return None
+        records = Repodata.cached(connection, comps_xml, Repodata.comps)
+        names_pkgs = [record for record in records if not isinstance(record, Group)]
+        return names_pkgs or None
 
     @staticmethod
-    def grouplist(connection):
+    def rhua_repo_revision(connection, repo):
+        """return the repomd revision of the (freshly exported) repo on the RHUA"""
+        RHUIManagerCLI.repo_export(connection, repo)
+        time.sleep(3)
+        relative_path = RHUIManagerCLI.repo_info(connection, repo)["relativepath"]
+        return Repodata.repomd(connection, Repodata.repo_dir(relative_path)).revision
+
+    @staticmethod
+    def cached_revision(connection, client_repo):
+        """return the repomd revision of the repo in the client's metadata cache, or None"""
+        # yum keeps the file in .../<repo ID>/, dnf in .../<repo ID>-<16 hex digits>/repodata/
+        cmd = "find /var/cache/yum /var/cache/dnf -name repomd.xml " \
+              f"\\( -path '*/{client_repo}/*' -o -path '*/{client_repo}-{'?' * 16}/*' \\) " \
+              "2> /dev/null | head -1 | " \
+              "xargs -r sed -n 's|.*<revision>\\(.*\\)</revision>.*|\\1|p'"
+        _, stdout, _ = connection.exec_command(cmd)
+        revision = stdout.read().decode().strip()
+        return revision or None
+
+    @staticmethod
+    def refresh_metadata(connection, revisions):
+        """refresh the client's cached metadata of the given repos, unless it is up to date"""
+        # revisions: {client repo ID: revision of the repo on the RHUA}; if the revision is unknown
+        # (empty), the repo is always refreshed; the metadata of other repos is kept intact;
+        # return a list of the refreshed repos
+        stale_repos = [repo for repo, revision in revisions.items() \
+                       if not revision or Yummy.cached_revision(connection, repo) != revision]
+        if stale_repos:
+            repo_opts = f"--disablerepo='*' --enablerepo={','.join(stale_repos)}"
+            Expect.expect_retval(connection, f"yum clean metadata {repo_opts}")
+            Expect.expect_retval(connection, f"yum makecache {repo_opts}", timeout=120)
+        return stale_repos
+
+    @staticmethod
+    def grouplist(connection, revisions=None):
         """return a sorted list of yum groups available to the client"""
-        # first clean metadata, which may contain outdated information
-        Expect.expect_retval(connection, "yum clean all")
+        # first clean metadata, which may contain outdated information;
+        # if revisions ({client repo ID: revision on the RHUA}) are known,
+        # only refresh the metadata of the repos whose cached revision differs,
+        # otherwise clean everything
+        if revisions is None:
+            Expect.expect_retval(connection, "yum clean all")
+        else:
+            Yummy.refresh_metadata(connection, revisions)
         # fetch the complete output from the command
         _, stdout, _ = connection.exec_command("yum grouplist")
         all_lines = stdout.read().decode().splitlines()
@@ -152,3 +187,42 @@ class Yummy():
         if downloaddir:
             cmd += " --downloaddir " + downloaddir
         Expect.expect_retval(connection, cmd, 1 if expect_trouble else 0, timeout)
+
+    @staticmethod
+    def batch_install(connections, packages, gpgcheck=True, timeout=20, expect_trouble=False):
+        """install packages on all the clients at once, return a list of BatchResults"""
+        return _run_on_clients(connections, Yummy.install,
+                               packages, gpgcheck, timeout, expect_trouble)
+
+    @staticmethod
+    def batch_downgrade(connections, packages, gpgcheck=True, timeout=20, expect_trouble=False):
+        """downgrade packages on all the clients at once, return a list of BatchResults"""
+        return _run_on_clients(connections, Yummy.downgrade,
+                               packages, gpgcheck, timeout, expect_trouble)
+
+    @staticmethod
+    def batch_repolist(connections, alll=False, enabled=True, disabled=False):
+        """get yum repositories from all the clients at once, return a list of BatchResults"""
+        return _run_on_clients(connections, Yummy.repolist, alll, enabled, disabled)
+
+    @staticmethod
+    def batch_grouplist(connections):
+        """get yum groups from all the clients at once, return a list of BatchResults"""
+        return _run_on_clients(connections, Yummy.grouplist)
+
+    @staticmethod
+    def batch_download(connections, packages, downloaddir="", timeout=20, expect_trouble=False):
+        """download packages on all the clients at once, return a list of BatchResults"""
+        return _run_on_clients(connections, Yummy.download,
+                               packages, downloaddir, timeout, expect_trouble)
+
+    @staticmethod
+    def batch_failures(results):
+        """return (hostname, exception) pairs for the clients on which the batch operation failed"""
+        return [(result.hostname, result.error) for result in results if result.error]
+
+    @staticmethod
+    def batch_timings(results):
+        """return (hostname, duration) pairs from a batch operation, the slowest client first"""
+        timings = [(result.hostname, result.duration) for result in results]
+        return sorted(timings, key=lambda timing: timing[1], reverse=True)
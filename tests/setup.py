@@ -8,7 +8,9 @@ from glob import glob
 
 from setuptools import setup
 
-REQUIREMENTS = ['nose', 'requests', 'stitches', 'xmltodict']
+REQUIREMENTS = ['nose', 'requests', 'stitches']
+# zstandard is only needed to read zstd-compressed repodata
+EXTRAS = {'zstd': ['zstandard']}
 
 DATAFILES = [('share/rhui4_tests_lib/rhui4_tests', glob('rhui4_tests/test_*.py')),
              ('/etc/rhui4_tests/', ['rhui4_tests/tested_repos.yaml']),
@@ -28,6 +30,8 @@ setup(name='rhui4_tests_lib',
       ],
       data_files=DATAFILES,
       install_requires=REQUIREMENTS,
+      extras_require=EXTRAS,
+      entry_points={'nose.plugins.0.10': ['rhuievents = rhui4_tests_lib.events:EventStream']},
       zip_safe=False,
       classifiers=[
           'License :: OSI Approved :: GNU General Public License v3 or later (GPLv3+)',